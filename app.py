@@ -4,6 +4,7 @@ Streamlit app for image/video gallery with AI-powered search and summaries.
 """
 import streamlit as st
 import sys
+import threading
 from pathlib import Path
 
 # Add project root
@@ -12,51 +13,46 @@ sys.path.insert(0, str(sys_path))
 
 from config import UPLOADS_DIR, GALLERY_DIR
 from services.data_service import (
-    get_gallery_items,
+    get_gallery_view,
+    get_gallery_item,
+    get_categories,
     save_gallery_items,
     get_ratings,
     save_rating,
     get_avg_rating,
-    get_playlists,
     save_playlist,
     add_to_playlist,
+    remove_from_playlist,
+    delete_playlist,
     add_gallery_item,
     delete_gallery_item,
     clear_entire_gallery,
 )
-from services.ai_service import search_semantic, get_ai_summary
-import re
-
-# Page config
-
-
-def extract_youtube_id(url: str):
-    """Extract YouTube video ID from various URL formats."""
-    if not url or not isinstance(url, str):
-        return None
-    patterns = [
-        r"(?:youtube\.com/watch\?v=)([a-zA-Z0-9_-]{11})",
-        r"(?:youtube\.com/embed/)([a-zA-Z0-9_-]{11})",
-        r"(?:youtu\.be/)([a-zA-Z0-9_-]{11})",
-    ]
-    for p in patterns:
-        m = re.search(p, url)
-        if m:
-            return m.group(1)
-    return None
-
-
-def normalize_youtube_url(url: str) -> str:
-    """Convert YouTube URL to embed format for reliable playback."""
-    vid = extract_youtube_id(url)
-    return f"https://www.youtube.com/embed/{vid}" if vid else url
-
+from services.ai_service import get_ai_summary
+from services.gallery_service import filter_and_sort, SORT_OPTIONS
+from services.transcript_index import search_item_moments, search_moments
+from services.recommender import related_items
+from services.playlist_service import (
+    PAGE_SIZE,
+    SET_OPERATIONS,
+    combine,
+    get_all_playlists,
+    get_playlist,
+    resolve,
+)
+from services.thumbnail_cache import local_or_remote, prefetch_in_background
+from services.analytics import average, get_rollups, rebuild as rebuild_analytics, top_items
+from services import metrics
+from services.media_utils import (
+    extract_youtube_id,
+    item_thumbnail,
+    normalize_youtube_url,
+    get_youtube_thumbnail,
+)
 
-def get_youtube_thumbnail(url: str) -> str:
-    """Get YouTube thumbnail image URL from video URL."""
-    vid = extract_youtube_id(url)
-    return f"https://img.youtube.com/vi/{vid}/hqdefault.jpg" if vid else url
+RESULTS_PAGE_SIZE = 20
 
+# Page config
 st.set_page_config(
     page_title="Interactive Media Intelligence Dashboard",
     page_icon="🎬",
@@ -158,8 +154,7 @@ def render_sidebar():
         st.divider()
         
         # Categories
-        items = get_gallery_items()
-        categories = ["All"] + sorted(set(i.get("category", "Other") for i in items))
+        categories = ["All"] + get_categories()
         selected_cat = st.selectbox("Category", categories)
         
         # Content type
@@ -167,21 +162,33 @@ def render_sidebar():
         selected_type = st.selectbox("Content Type", types)
         
         # Sort
-        sort_by = st.selectbox(
-            "Sort by",
-            ["Relevance", "Title A-Z", "Title Z-A", "Rating", "Newest"]
-        )
+        sort_by = st.selectbox("Sort by", SORT_OPTIONS)
+
+        if st.button("📊 Analytics dashboard", key="open_analytics", use_container_width=True):
+            st.session_state.analytics_view = True
+            st.session_state.pop("selected_item", None)
+            st.session_state.pop("playlist_view", None)
+            st.rerun()
         
         st.divider()
         st.markdown("### 📋 Playlists")
-        playlists = get_playlists()
+        playlists = get_all_playlists()
         if playlists:
-            for name, ids in playlists.items():
-                with st.expander(f"📁 {name} ({len(ids)} items)"):
-                    for item_id in ids[:5]:
-                        st.caption(f"• {item_id}")
-                    if len(ids) > 5:
-                        st.caption(f"... and {len(ids)-5} more")
+            # Resolve every preview in one pass over the gallery
+            previews = {i.get("id"): i for i in resolve([i for p in playlists.values() for i in p.page(0, 5)])}
+            for name, playlist in playlists.items():
+                with st.expander(f"📁 {name} ({len(playlist)} items)"):
+                    for item_id in playlist.page(0, 5):
+                        st.caption(f"• {previews.get(item_id, {}).get('title', item_id)}")
+                    if len(playlist) > 5:
+                        st.caption(f"... and {len(playlist)-5} more")
+                    if st.button("▶ Open", key=f"open_pl_{name}", use_container_width=True):
+                        st.session_state.playlist_view = name
+                        st.session_state.playlist_page = 0
+                        st.session_state.playlist_pos = 0
+                        st.session_state.pop("selected_item", None)
+                        st.session_state.pop("analytics_view", None)
+                        st.rerun()
         else:
             st.caption("No playlists yet. Create one from an item!")
         
@@ -221,35 +228,14 @@ def render_sidebar():
     return selected_cat, selected_type, sort_by
 
 
-def filter_and_sort(items, category, content_type, sort_by, query=""):
-    """Filter and sort gallery items."""
-    if query:
-        items = search_semantic(query, items)
-    if category != "All":
-        items = [i for i in items if i.get("category") == category]
-    if content_type != "All":
-        items = [i for i in items if i.get("type") == content_type]
-    
-    if sort_by == "Title A-Z":
-        items = sorted(items, key=lambda x: x.get("title", "").lower())
-    elif sort_by == "Title Z-A":
-        items = sorted(items, key=lambda x: x.get("title", "").lower(), reverse=True)
-    elif sort_by == "Rating":
-        items = sorted(items, key=lambda x: get_avg_rating(x.get("id")) or 0, reverse=True)
-    
-    return items
-
-
+@metrics.timed("app.render_item_card")
 def render_item_card(item, show_actions=True):
     """Render a single gallery item card."""
     item_id = item.get("id", "")
     title = item.get("title", "Untitled")
     category = item.get("category", "")
     desc = item.get("description", "")[:150] + "..." if len(item.get("description", "")) > 150 else item.get("description", "")
-    source = item.get("source", "")
-    thumbnail = item.get("thumbnail", "https://picsum.photos/400/225")
-    if extract_youtube_id(source):
-        thumbnail = get_youtube_thumbnail(source) or thumbnail
+    thumbnail = local_or_remote(item_thumbnail(item))
     item_type = item.get("type", "video")
     actions = item.get("actions", [])
     
@@ -276,6 +262,7 @@ def render_item_card(item, show_actions=True):
             # Primary action - View details (prominent)
             if st.button("👁️ View details", key=f"view_{item_id}", use_container_width=True):
                 st.session_state.selected_item = item_id
+                st.session_state.pop("seek_sec", None)
                 st.rerun()
             
             # Secondary actions in expander
@@ -289,7 +276,7 @@ def render_item_card(item, show_actions=True):
                         st.success("Saved!")
                 with r2:
                     st.caption("📁 Add to playlist")
-                    playlists = get_playlists()
+                    playlists = get_all_playlists()
                     pl_name = st.selectbox("Playlist", [""] + list(playlists.keys()), key=f"pl_{item_id}", label_visibility="collapsed")
                     if pl_name and st.button("➕ Add", key=f"add_pl_{item_id}", use_container_width=True):
                         add_to_playlist(pl_name, item_id)
@@ -315,6 +302,23 @@ def render_item_card(item, show_actions=True):
         st.divider()
 
 
+def render_moments(moments, key_prefix):
+    """List transcript/action matches with a button that seeks the video there."""
+    for n, m in enumerate(moments):
+        c1, c2 = st.columns([4, 1])
+        with c1:
+            s, start, end = m["snippet"], m["match_offset"], m["match_offset"] + len(m["match"])
+            snippet = f"{s[:start]}**{s[start:end]}**{s[end:]}"
+            label = "🎬 Action" if m["field"] == "action" else "📜 Transcript"
+            st.markdown(f"{label} · *{m['title']}* @ `{m['start_time']}`  \n{snippet}")
+        with c2:
+            if st.button("▶ Jump", key=f"{key_prefix}_moment_{n}", use_container_width=True):
+                st.session_state.selected_item = m["item_id"]
+                st.session_state.seek_sec = m["start_sec"]
+                st.rerun()
+
+
+@metrics.timed("app.render_item_detail")
 def render_item_detail(item):
     """Render full item detail view."""
     item_id = item.get("id", "")
@@ -324,14 +328,12 @@ def render_item_detail(item):
     col1, col2 = st.columns([1, 1])
     with col1:
         source = item.get("source", "")
-        thumb = item.get("thumbnail", "https://picsum.photos/800/450")
-        if extract_youtube_id(source):
-            thumb = get_youtube_thumbnail(source) or thumb
+        thumb = item_thumbnail(item, "https://picsum.photos/800/450")
         st.image(thumb, use_container_width=True)
         if item.get("type") == "video":
             video_url = normalize_youtube_url(source) if source else source
             if video_url:
-                st.video(video_url)
+                st.video(video_url, start_time=st.session_state.get("seek_sec", 0))
         else:
             st.image(source or thumb, use_container_width=True)
     
@@ -346,6 +348,13 @@ def render_item_detail(item):
         if item.get("transcript"):
             with st.expander("📜 Transcript"):
                 st.write(item["transcript"])
+
+        moment_query = st.text_input("🔎 Find a moment", placeholder="e.g., add the pasta", key=f"moment_q_{item_id}")
+        if moment_query:
+            moments = search_item_moments(item, moment_query, limit=10)
+            if not moments:
+                st.caption("No matching moment.")
+            render_moments(moments, key_prefix="detail")
         
         st.markdown("### AI Summary")
         if st.button("🤖 Generate AI summary", key="gen_summary", use_container_width=True):
@@ -355,6 +364,18 @@ def render_item_detail(item):
             )
             st.info(summary)
     
+    related = related_items(item_id)
+    if related:
+        st.markdown("### More like this")
+        cols = st.columns(min(len(related), 3))
+        for n, rel in enumerate(related):
+            with cols[n % len(cols)]:
+                st.caption(f"📂 {rel.get('category', '')}")
+                if st.button(rel.get("title", "Untitled"), key=f"related_{rel.get('id')}", use_container_width=True):
+                    st.session_state.selected_item = rel.get("id")
+                    st.session_state.pop("seek_sec", None)
+                    st.rerun()
+
     # Action buttons - organized row
     st.markdown("---")
     btn1, btn2, btn3 = st.columns(3)
@@ -362,6 +383,7 @@ def render_item_detail(item):
         if st.button("← Back to gallery", use_container_width=True):
             if "selected_item" in st.session_state:
                 del st.session_state.selected_item
+            st.session_state.pop("seek_sec", None)
             st.rerun()
     with btn2:
         if st.session_state.get("confirm_delete_detail") == item_id:
@@ -441,6 +463,175 @@ def render_upload():
                 st.rerun()
 
 
+def render_debug_panel(rerun_mark: int):
+    """Sidebar profiling panel: last rerun breakdown plus process-wide aggregates."""
+    if not metrics.is_enabled():
+        return
+    with st.sidebar:
+        st.divider()
+        with st.expander("🛠️ Debug: performance", expanded=False):
+            # Streamlit runs each session's script on its own thread, all named
+            # alike, so match on the thread id; other sessions' spans recorded
+            # meanwhile don't belong to this rerun
+            thread_id = threading.get_ident()
+            traces = [t for t in metrics.traces_since(rerun_mark) if t["thread_id"] == thread_id]
+            rerun = {}
+            for t in traces:
+                agg = rerun.setdefault(t["name"], {"span": t["name"], "calls": 0, "ms": 0.0})
+                agg["calls"] += 1
+                agg["ms"] = round(agg["ms"] + t["duration_ms"], 3)
+            st.caption("Last rerun")
+            st.dataframe(sorted(rerun.values(), key=lambda r: -r["ms"]), use_container_width=True, hide_index=True)
+            st.caption("Since process start")
+            st.dataframe(metrics.snapshot(), use_container_width=True, hide_index=True)
+            st.download_button("Prometheus metrics", metrics.to_prometheus(), "metrics.prom", "text/plain")
+            st.download_button("JSONL traces", metrics.traces_jsonl(), "traces.jsonl", "application/x-ndjson")
+            if st.button("Reset metrics", key="reset_metrics"):
+                metrics.reset()
+                st.rerun()
+
+
+def render_playlist(name):
+    """Playlist page: player for the current entry, paginated entries, set operations."""
+    playlist = get_playlist(name)
+    st.markdown(f"## 📁 {name}")
+    st.caption(f"{len(playlist)} item(s)")
+
+    if len(playlist):
+        pos = min(st.session_state.get("playlist_pos", 0), len(playlist) - 1)
+        current = resolve([playlist.ids[pos]])
+        if current:
+            item = current[0]
+            st.markdown(f"### ▶ {pos + 1}. {item.get('title', 'Untitled')}")
+            source = item.get("source", "")
+            if item.get("type") == "video" and source:
+                st.video(normalize_youtube_url(source))
+            else:
+                st.image(source or item.get("thumbnail", "https://picsum.photos/800/450"), use_container_width=True)
+        p1, p2 = st.columns(2)
+        with p1:
+            if st.button("⏮ Previous", disabled=pos == 0, use_container_width=True):
+                st.session_state.playlist_pos = pos - 1
+                st.session_state.playlist_page = (pos - 1) // PAGE_SIZE
+                st.rerun()
+        with p2:
+            if st.button("Next ⏭", disabled=pos >= len(playlist) - 1, use_container_width=True):
+                st.session_state.playlist_pos = pos + 1
+                st.session_state.playlist_page = (pos + 1) // PAGE_SIZE
+                st.rerun()
+
+        st.divider()
+        pages = playlist.page_count()
+        page = min(st.session_state.get("playlist_page", 0), pages - 1)
+        for n, item in enumerate(resolve(playlist.page(page)), page * PAGE_SIZE):
+            item_id = item.get("id", "")
+            c1, c2, c3 = st.columns([4, 1, 1])
+            with c1:
+                st.markdown(f"**{n + 1}. {item.get('title', 'Untitled')}**")
+                st.caption(f"📂 {item.get('category', '')} | {item.get('type', 'video')}")
+            with c2:
+                if st.button("▶ Play", key=f"pl_play_{item_id}", use_container_width=True):
+                    st.session_state.playlist_pos = n
+                    st.rerun()
+            with c3:
+                if st.button("✖ Remove", key=f"pl_remove_{item_id}", use_container_width=True):
+                    remove_from_playlist(name, [item_id])
+                    st.rerun()
+        n1, n2, n3 = st.columns([1, 2, 1])
+        with n1:
+            if st.button("← Prev page", disabled=page == 0, use_container_width=True):
+                st.session_state.playlist_page = page - 1
+                st.rerun()
+        with n2:
+            st.caption(f"Page {page + 1} of {pages}")
+        with n3:
+            if st.button("Next page →", disabled=page >= pages - 1, use_container_width=True):
+                st.session_state.playlist_page = page + 1
+                st.rerun()
+
+    others = [p for p in get_all_playlists() if p != name]
+    if others:
+        with st.expander("🔀 Combine with another playlist"):
+            other = st.selectbox("Other playlist", others, key="pl_other")
+            operation = st.radio("Operation", list(SET_OPERATIONS), horizontal=True, key="pl_op")
+            new_name = st.text_input("New playlist name", key="pl_new_name", placeholder=f"{name} {operation.lower()} {other}")
+            if st.button("Create combined playlist", key="pl_combine"):
+                target = (new_name or "").strip() or f"{name} {operation.lower()} {other}"
+                result = combine(name, other, operation, target)
+                if result is None:
+                    st.error(f"A playlist named '{target}' already exists. Choose another name.")
+                else:
+                    st.success(f"Created '{result.name}' with {len(result)} item(s)")
+
+    st.markdown("---")
+    b1, b2 = st.columns(2)
+    with b1:
+        if st.button("← Back to gallery", key="pl_back", use_container_width=True):
+            st.session_state.pop("playlist_view", None)
+            st.rerun()
+    with b2:
+        if st.button("🗑️ Delete playlist", key="pl_delete", use_container_width=True):
+            delete_playlist(name)
+            st.session_state.pop("playlist_view", None)
+            st.rerun()
+
+
+def _group_rows(groups, label):
+    return [
+        {label: name, "Items": g["items"], "Ratings": g["ratings"], "Avg rating": average(g)}
+        for name, g in sorted(groups.items())
+    ]
+
+
+@metrics.timed("app.render_analytics")
+def render_analytics():
+    """Engagement dashboard. Reads only the rollups, so its cost doesn't grow with the gallery."""
+    rollups = get_rollups()
+    overall = rollups["overall"]
+    st.markdown("## 📊 Engagement analytics")
+
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Items", f"{overall['items']:,}")
+    c2.metric("Ratings", f"{overall['ratings']:,}")
+    c3.metric("Avg rating", average(overall) or "–")
+    c4.metric("Categories", len(rollups["by_category"]))
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("### By category")
+        st.dataframe(_group_rows(rollups["by_category"], "Category"), hide_index=True, use_container_width=True)
+    with col2:
+        st.markdown("### By type")
+        st.dataframe(_group_rows(rollups["by_type"], "Type"), hide_index=True, use_container_width=True)
+
+    st.markdown("### Rating distribution")
+    stars = [f"{n}★" for n in range(1, len(overall["histogram"]) + 1)]
+    st.bar_chart({name: dict(zip(stars, g["histogram"])) for name, g in sorted(rollups["by_category"].items())})
+
+    st.markdown("### Top rated")
+    st.caption("Ranked by average rating, damped towards 3★ for items with few ratings")
+    for n, top in enumerate(top_items(rollups), 1):
+        t1, t2 = st.columns([4, 1])
+        with t1:
+            st.markdown(f"**{n}. {top['title'] or top['item_id']}** — ⭐ {top['avg_rating']} ({top['ratings']} ratings)")
+        with t2:
+            if st.button("👁️ View", key=f"top_{top['item_id']}", use_container_width=True):
+                st.session_state.selected_item = top["item_id"]
+                st.session_state.pop("analytics_view", None)
+                st.rerun()
+
+    st.markdown("---")
+    b1, b2 = st.columns(2)
+    with b1:
+        if st.button("← Back to gallery", key="analytics_back", use_container_width=True):
+            st.session_state.pop("analytics_view", None)
+            st.rerun()
+    with b2:
+        if st.button("🔄 Rebuild from data files", key="analytics_rebuild", use_container_width=True):
+            rebuild_analytics()
+            st.rerun()
+
+
 def main():
     init_session()
     
@@ -454,11 +645,18 @@ def main():
     
     # Selected item detail view
     if "selected_item" in st.session_state:
-        items = get_gallery_items()
-        match = next((i for i in items if i.get("id") == st.session_state.selected_item), None)
+        match = get_gallery_item(st.session_state.selected_item)
         if match:
             render_item_detail(match)
             return
+
+    if "playlist_view" in st.session_state:
+        render_playlist(st.session_state.playlist_view)
+        return
+
+    if st.session_state.get("analytics_view"):
+        render_analytics()
+        return
     
     # Main content: Search toolbar
     st.markdown("#### 🔍 Search & browse")
@@ -474,7 +672,7 @@ def main():
         view_mode = st.radio("View", ["grid", "list"], format_func=lambda x: "🔲 Grid" if x == "grid" else "📋 List", horizontal=True, key="view_mode", label_visibility="collapsed")
     
     # Filter and sort
-    items = get_gallery_items()
+    items = get_gallery_view()
     if not items:
         st.warning("No items in gallery. Run `python scripts/generate_sample_data.py` or upload content.")
         render_upload()
@@ -483,10 +681,36 @@ def main():
     filtered = filter_and_sort(items, selected_cat, selected_type, sort_by, query)
     
     st.markdown(f"### Found {len(filtered)} result(s)")
+
+    if query:
+        moments = search_moments(query, limit=10)
+        if moments:
+            with st.expander(f"🎯 Matching moments ({len(moments)})", expanded=True):
+                render_moments(moments, key_prefix="search")
     
-    # Gallery
-    for item in filtered:
+    # Gallery, one page at a time; thumbnails for the page are cached locally in the background
+    filters = (query, selected_cat, selected_type, sort_by)
+    if st.session_state.get("results_filters") != filters:
+        st.session_state.results_filters = filters
+        st.session_state.results_page = 0
+    pages = max(1, -(-len(filtered) // RESULTS_PAGE_SIZE))
+    page = min(st.session_state.get("results_page", 0), pages - 1)
+    page_items = filtered[page * RESULTS_PAGE_SIZE:(page + 1) * RESULTS_PAGE_SIZE]
+    prefetch_in_background([item_thumbnail(item) for item in page_items])
+    for item in page_items:
         render_item_card(item)
+    if pages > 1:
+        n1, n2, n3 = st.columns([1, 2, 1])
+        with n1:
+            if st.button("← Prev page", key="results_prev", disabled=page == 0, use_container_width=True):
+                st.session_state.results_page = page - 1
+                st.rerun()
+        with n2:
+            st.caption(f"Page {page + 1} of {pages}")
+        with n3:
+            if st.button("Next page →", key="results_next", disabled=page >= pages - 1, use_container_width=True):
+                st.session_state.results_page = page + 1
+                st.rerun()
     
     # Upload section
     st.divider()
@@ -495,4 +719,7 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    rerun_mark = metrics.mark()
+    with metrics.span("app.rerun"):
+        main()
+    render_debug_panel(rerun_mark)
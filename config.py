@@ -10,13 +10,15 @@ except ImportError:
 
 # Paths
 BASE_DIR = Path(__file__).resolve().parent
-DATA_DIR = BASE_DIR / "data"
+DATA_DIR = Path(os.getenv("MEDIA_DATA_DIR", BASE_DIR / "data"))
 UPLOADS_DIR = DATA_DIR / "uploads"
 GALLERY_DIR = DATA_DIR / "gallery"
 THUMBNAILS_DIR = DATA_DIR / "thumbnails"
 METADATA_FILE = DATA_DIR / "gallery_metadata.json"
 RATINGS_FILE = DATA_DIR / "user_ratings.json"
 PLAYLISTS_FILE = DATA_DIR / "user_playlists.json"
+RELATED_DB = DATA_DIR / "related_items.db"
+ANALYTICS_FILE = DATA_DIR / "analytics_rollups.json"
 
 # API Keys
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY", "")
@@ -25,6 +27,16 @@ GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
 # AI Provider preference: "gemini" or "groq"
 AI_PROVIDER = os.getenv("AI_PROVIDER", "gemini")
 
+# Writes arriving within this window are merged into one group commit
+WRITE_GROUP_WINDOW_MS = float(os.getenv("WRITE_GROUP_WINDOW_MS", "5"))
+
+# Shared-memory gallery snapshot across worker processes on one host.
+# Set to a segment name prefix (e.g. "media_gallery") to enable; empty = off.
+SHARED_SNAPSHOT = os.getenv("SHARED_SNAPSHOT", "")
+
+# Instrumentation: timing spans + sidebar debug panel
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "").lower() in ("1", "true", "yes")
+
 # Create directories
 for d in [DATA_DIR, UPLOADS_DIR, GALLERY_DIR, THUMBNAILS_DIR]:
     d.mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,144 @@
+"""Benchmark gallery operations on synthetic galleries of increasing size.
+
+Usage:
+    python scripts/benchmark.py --sizes 1000 10000 100000 --out bench.json
+    python scripts/benchmark.py --sizes 1000 --compare bench.json
+
+Data is generated into a temporary directory (MEDIA_DATA_DIR), never ./data.
+Results are written as JSON so runs from different commits can be compared.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+def timeit(fn, repeat: int) -> dict:
+    """Run fn repeat times and return timing stats in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return {
+        "repeat": repeat,
+        "min_ms": round(min(samples), 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "max_ms": round(max(samples), 3),
+    }
+
+
+def bench_size(size: int, seed: int, repeat: int) -> list:
+    """Generate a gallery of `size` items and time each operation on it."""
+    from config import METADATA_FILE, RATINGS_FILE, PLAYLISTS_FILE
+    from generate_sample_data import generate_gallery
+    from services import data_service as ds
+    from services.ai_service import search_semantic
+    from services.gallery_service import filter_and_sort, SORT_OPTIONS
+
+    items, ratings, playlists = generate_gallery(size, seed)
+    ds.save_json(METADATA_FILE, items)
+    ds.save_json(RATINGS_FILE, ratings)
+    ds.save_json(PLAYLISTS_FILE, playlists)
+    rated_id = next(iter(ratings), items[0]["id"])
+    loaded = ds.get_gallery_items()
+
+    # Slow operations (whole-file rewrites) get fewer repeats at large sizes
+    write_repeat = max(1, repeat if size <= 10_000 else repeat // 5)
+    cases = [
+        ("get_gallery_items", ds.get_gallery_items, repeat),
+        ("search_semantic", lambda: search_semantic("pasta boiling water", loaded), repeat),
+    ]
+    for sort_by in SORT_OPTIONS:
+        cases.append((
+            f"filter_and_sort[{sort_by}]",
+            lambda s=sort_by: filter_and_sort(loaded, "Cooking", "All", s, "pasta"),
+            repeat,
+        ))
+    cases += [
+        ("get_avg_rating", lambda: ds.get_avg_rating(rated_id), repeat),
+        ("save_rating", lambda: ds.save_rating(rated_id, 4, "bench_user"), write_repeat),
+    ]
+
+    added = []
+    cases.append((
+        "add_gallery_item",
+        lambda: added.append(ds.add_gallery_item({"title": "Bench item", "category": "Other", "type": "image"})),
+        write_repeat,
+    ))
+    cases.append(("delete_gallery_item", lambda: ds.delete_gallery_item(added.pop()), write_repeat))
+
+    results = []
+    for op, fn, n in cases:
+        row = {"size": size, "op": op, **timeit(fn, n)}
+        results.append(row)
+        print(f"{size:>9} {op:<32} median {row['median_ms']:>10.3f} ms  (n={n})")
+    return results
+
+
+def git_commit() -> str:
+    """Current git commit hash, or empty string outside a checkout."""
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+        return out.stdout.strip()
+    except OSError:
+        return ""
+
+
+def compare(results: list, baseline_path: Path) -> None:
+    """Print median ratios against a previous benchmark file."""
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    base = {(r["size"], r["op"]): r["median_ms"] for r in baseline.get("results", [])}
+    print(f"\nCompared with {baseline_path} ({baseline.get('meta', {}).get('commit', '')[:10]}):")
+    for r in results:
+        old = base.get((r["size"], r["op"]))
+        if old:
+            ratio = r["median_ms"] / old if old else float("inf")
+            flag = "  REGRESSION" if ratio > 1.2 else ""
+            print(f"{r['size']:>9} {r['op']:<32} {old:>10.3f} -> {r['median_ms']:>10.3f} ms  x{ratio:.2f}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark gallery operations.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10_000, 100_000])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", type=Path, default=Path("bench_results.json"))
+    parser.add_argument("--compare", type=Path, help="previous results file to compare against")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="media_bench_") as tmp:
+        # Must be set before config is imported
+        os.environ["MEDIA_DATA_DIR"] = tmp
+        results = []
+        for size in args.sizes:
+            results.extend(bench_size(size, args.seed, args.repeat))
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "results": results,
+    }
+    args.out.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"\nWrote {len(results)} results to {args.out}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Bulk import gallery items from a JSONL feed (one JSON object per line).
+
+Usage:
+    python scripts/bulk_import.py feed.jsonl [--dry-run] [--batch-size N]
+                                             [--errors errors.jsonl]
+
+Each record is validated and normalized the same way the upload form does
+(YouTube embed URLs, derived thumbnails, action timestamps). Valid items are
+appended to the gallery in batches. Every commit rewrites the whole metadata
+file, so a commit costs O(gallery size) and small batches make the import
+quadratic; keep batches large.
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from services.data_service import add_gallery_items
+from services.media_utils import (
+    DEFAULT_SOURCE,
+    DEFAULT_THUMBNAIL,
+    extract_youtube_id,
+    normalize_action,
+)
+
+VALID_TYPES = ("video", "image")
+DEFAULT_ACTIONS = [{"name": "Uploaded content", "start_time": "00:00:00", "timestamp_sec": 0}]
+
+
+def normalize_record(record: dict) -> dict:
+    """Validate a feed record and return a gallery item. Raises ValueError."""
+    if not isinstance(record, dict):
+        raise ValueError("record is not a JSON object")
+    title = str(record.get("title") or "").strip()
+    if not title:
+        raise ValueError("missing title")
+    content_type = record.get("type") or "video"
+    if content_type not in VALID_TYPES:
+        raise ValueError(f"invalid type '{content_type}'")
+
+    source = str(record.get("source") or record.get("url") or "").strip()
+    thumbnail = str(record.get("thumbnail") or "").strip()
+    vid = extract_youtube_id(source)
+    if vid:
+        source = f"https://www.youtube.com/embed/{vid}"
+        thumbnail = f"https://img.youtube.com/vi/{vid}/hqdefault.jpg"
+    elif content_type == "video" and not source:
+        raise ValueError("video without source URL")
+    source = source or DEFAULT_SOURCE
+    if not thumbnail:
+        thumbnail = source if content_type == "image" else DEFAULT_THUMBNAIL
+
+    actions = record.get("actions")
+    if actions:
+        if not isinstance(actions, list):
+            raise ValueError("actions must be a list")
+        actions = [normalize_action(a) for a in actions]
+    else:
+        actions = [dict(a) for a in DEFAULT_ACTIONS]
+
+    tags = record.get("tags") or []
+    if isinstance(tags, str):
+        tags = tags.split(",")
+    elif not isinstance(tags, list):
+        raise ValueError("tags must be a list or a comma-separated string")
+    tags = [str(t).strip() for t in tags if str(t).strip()]
+
+    item = {
+        "title": title,
+        "category": str(record.get("category") or "Other"),
+        "type": content_type,
+        "description": str(record.get("description") or "").strip(),
+        "source": source,
+        "thumbnail": thumbnail,
+        "actions": actions,
+        "transcript": str(record.get("transcript") or ""),
+        "tags": tags,
+    }
+    if record.get("duration"):
+        item["duration"] = str(record["duration"])
+    return item
+
+
+def import_feed(path: Path, batch_size: int = 100_000, dry_run: bool = False, errors_path: Path = None) -> dict:
+    """Stream a JSONL feed into the gallery. Returns import stats."""
+    started = time.perf_counter()
+    pending = []
+    stats = {"read": 0, "imported": 0, "errors": 0, "commits": 0}
+    errors_file = open(errors_path, "w", encoding="utf-8") if errors_path else None
+
+    def commit():
+        if not pending:
+            return
+        if not dry_run:
+            # Ids are assigned inside the locked read-modify-write, against the
+            # gallery as it is now, not as it was when the import started
+            add_gallery_items(pending)
+            stats["commits"] += 1
+        stats["imported"] += len(pending)
+        pending.clear()
+
+    try:
+        # Binary mode: a line that isn't valid UTF-8 is rejected on its own
+        # instead of failing the whole iteration
+        with open(path, "rb") as f:
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                stats["read"] += 1
+                try:
+                    pending.append(normalize_record(json.loads(line.decode("utf-8"))))
+                except ValueError as e:
+                    # json.JSONDecodeError and UnicodeDecodeError are ValueError subclasses
+                    stats["errors"] += 1
+                    if errors_file:
+                        errors_file.write(json.dumps({"line": line_no, "error": str(e)}) + "\n")
+                    continue
+                if len(pending) >= batch_size:
+                    commit()
+        commit()
+    finally:
+        if errors_file:
+            errors_file.close()
+
+    elapsed = time.perf_counter() - started
+    stats["seconds"] = round(elapsed, 3)
+    stats["items_per_sec"] = round(stats["imported"] / elapsed) if elapsed > 0 else 0
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import gallery items from JSONL.")
+    parser.add_argument("feed", type=Path, help="JSONL file, one item per line")
+    parser.add_argument("--batch-size", type=int, default=100_000, help="items per commit")
+    parser.add_argument("--dry-run", action="store_true", help="validate only, do not write")
+    parser.add_argument("--errors", type=Path, help="write rejected lines to this JSONL file")
+    args = parser.parse_args()
+
+    stats = import_feed(args.feed, max(args.batch_size, 1), args.dry_run, args.errors)
+    mode = "Validated" if args.dry_run else "Imported"
+    print(
+        f"{mode} {stats['imported']}/{stats['read']} items "
+        f"({stats['errors']} errors, {stats['commits']} commits) "
+        f"in {stats['seconds']}s - {stats['items_per_sec']} items/sec"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Check the thumbnail prefetcher against local HTTP servers.
+
+Usage:
+    python scripts/check_thumbnail_cache.py
+
+Two http.server instances on free ports stand in for two CDN hosts (the
+per-host limit is keyed on host:port). The check runs services.thumbnail_cache
+against them with a temporary THUMBNAILS_DIR (MEDIA_DATA_DIR, never ./data)
+and verifies that:
+
+- no host ever sees more than the per-host limit of concurrent requests,
+  while both hosts are fetched at once
+- an expired entry is revalidated with If-None-Match and a 304 keeps the
+  stored file
+- a 200 response that isn't an image is not stored
+- a failed URL is not refetched until its backoff has passed, and the
+  backoff doubles
+
+Exits non-zero if any check fails.
+"""
+import asyncio
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+PER_HOST = 3
+IMAGES_PER_HOST = 12
+DELAY_SEC = 0.1  # per image response, so requests to a host overlap
+ETAG = '"v1"'
+
+
+def png_bytes() -> bytes:
+    from PIL import Image
+
+    out = io.BytesIO()
+    Image.new("RGB", (800, 450), (200, 80, 40)).save(out, "PNG")
+    return out.getvalue()
+
+
+class Host:
+    """Request log and concurrency counters of one fake CDN host."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+        self.hits = {}
+        self.not_modified = 0
+
+
+def make_handler(host: Host, image: bytes):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            with host.lock:
+                host.active += 1
+                host.peak = max(host.peak, host.active)
+                host.hits[self.path] = host.hits.get(self.path, 0) + 1
+            try:
+                self.respond()
+            finally:
+                with host.lock:
+                    host.active -= 1
+
+        def respond(self):
+            if self.path.startswith("/fail/"):
+                self.send_error(500)
+                return
+            if self.path.startswith("/html/"):
+                self.send_bytes(b"<html><body>Not found</body></html>", "text/html")
+                return
+            time.sleep(DELAY_SEC)
+            if self.headers.get("If-None-Match") == ETAG:
+                with host.lock:
+                    host.not_modified += 1
+                self.send_response(304)
+                self.send_header("ETag", ETAG)
+                self.end_headers()
+                return
+            self.send_bytes(image, "image/png", ETAG)
+
+        def send_bytes(self, body: bytes, content_type: str, etag: str = None):
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            if etag:
+                self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def run_checks(bases: list, hosts: list) -> list:
+    """Run every check; returns (name, passed, detail) tuples."""
+    from services import thumbnail_cache as tc
+    from services.data_service import load_json, update_json
+
+    results = []
+
+    def check(name, passed, detail=""):
+        results.append((name, bool(passed), detail))
+
+    images = [f"{base}/img/{n}.png" for base in bases for n in range(IMAGES_PER_HOST)]
+    statuses = asyncio.run(tc.prefetch(images, per_host=PER_HOST, total=4 * PER_HOST))
+    peaks = [h.peak for h in hosts]
+    check("all images fetched", all(statuses.get(u) == 200 for u in images) and all(map(tc.cached_path, images)),
+          f"statuses {sorted(set(map(str, statuses.values())))}")
+    check("per-host concurrency limit", max(peaks) <= PER_HOST, f"peaks {peaks}, limit {PER_HOST}")
+    check("hosts fetched concurrently", min(peaks) > 1, f"peaks {peaks}")
+
+    stored = {u: tc.cache_path(u).stat().st_mtime_ns for u in images}
+    statuses = asyncio.run(tc.prefetch(images, max_age=0))
+    check("expired entries revalidate to 304", all(statuses.get(u) == 304 for u in images)
+          and sum(h.not_modified for h in hosts) == len(images), f"statuses {sorted(set(map(str, statuses.values())))}")
+    check("304 keeps the stored file", all(tc.cache_path(u).stat().st_mtime_ns == stored[u] for u in images))
+    check("fresh entries are not refetched", asyncio.run(tc.prefetch(images)) == {})
+
+    html = f"{bases[0]}/html/page"
+    statuses = asyncio.run(tc.prefetch([html]))
+    check("non-image payload not stored", str(statuses.get(html, "")).startswith("error")
+          and tc.cached_path(html) is None, f"status {statuses.get(html)!r}")
+
+    failing = f"{bases[0]}/fail/thumb"
+    asyncio.run(tc.prefetch([failing]))
+    asyncio.run(tc.prefetch([failing]))
+    entry = load_json(tc.INDEX_FILE, {}).get(failing, {})
+    check("failed URL backs off", hosts[0].hits.get("/fail/thumb") == 1 and entry.get("failures") == 1,
+          f"hits {hosts[0].hits.get('/fail/thumb')}, failures {entry.get('failures')}")
+
+    # Pretend the backoff has passed: the retry happens and the backoff doubles
+    def rewind(index):
+        index[failing]["failed_at"] -= tc.RETRY_BASE_SEC + 1
+    update_json(tc.INDEX_FILE, rewind, {})
+    asyncio.run(tc.prefetch([failing]))
+    entry = load_json(tc.INDEX_FILE, {}).get(failing, {})
+    check("retried after backoff, backoff doubles",
+          hosts[0].hits.get("/fail/thumb") == 2 and tc._retry_after(entry) == 2 * tc.RETRY_BASE_SEC,
+          f"hits {hosts[0].hits.get('/fail/thumb')}, retry after {tc._retry_after(entry)}s")
+    return results
+
+
+def main():
+    try:
+        image = png_bytes()
+    except ImportError:
+        raise SystemExit("Pillow is required: without it non-image payloads cannot be rejected")
+
+    hosts = [Host(), Host()]
+    servers = [ThreadingHTTPServer(("127.0.0.1", 0), make_handler(h, image)) for h in hosts]
+    for server in servers:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    bases = [f"http://127.0.0.1:{s.server_address[1]}" for s in servers]
+    try:
+        with tempfile.TemporaryDirectory(prefix="media_thumbs_") as tmp:
+            # Must be set before config is imported
+            os.environ["MEDIA_DATA_DIR"] = tmp
+            results = run_checks(bases, hosts)
+    finally:
+        for server in servers:
+            server.shutdown()
+
+    for name, passed, detail in results:
+        print(f"{'PASS' if passed else 'FAIL'}  {name}" + (f" ({detail})" if detail else ""))
+    failed = sum(1 for _, passed, _ in results if not passed)
+    print(f"\n{len(results) - failed}/{len(results)} checks passed")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,18 @@
-"""Generate sample gallery data for Interactive Media Intelligence Dashboard."""
-import json
+"""Generate sample gallery data for Interactive Media Intelligence Dashboard.
+
+Usage:
+    python scripts/generate_sample_data.py                 # the curated sample items
+    python scripts/generate_sample_data.py --count 100000  # seeded synthetic gallery
+"""
+import argparse
+import random
 import sys
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
-from config import METADATA_FILE, DATA_DIR
+from config import METADATA_FILE, RATINGS_FILE, PLAYLISTS_FILE, DATA_DIR
+from services.data_service import save_json
+from services.media_utils import format_timestamp
 
 SAMPLE_ITEMS = [
     {
@@ -143,10 +151,134 @@ SAMPLE_ITEMS = [
 ]
 
 
+# Vocabulary for synthetic items: category -> (subjects, actions, tags)
+VOCABULARY = {
+    "Cooking": (
+        ["pasta", "risotto", "curry", "sourdough", "omelette", "dumplings", "salad", "ramen"],
+        ["Boiling water", "Chopping onions", "Frying garlic", "Adding the pasta", "Seasoning",
+         "Stirring the sauce", "Plating", "Kneading dough", "Tasting"],
+        ["cooking", "recipe", "quick meal", "italian", "vegetarian", "baking", "asian"],
+    ),
+    "Fitness": (
+        ["HIIT", "yoga", "core", "mobility", "kettlebell", "running", "pilates", "stretching"],
+        ["Warm-up", "Jump squats", "Burpees", "Plank hold", "Mountain climbers", "Lunges",
+         "Cool-down stretches", "Push-ups"],
+        ["fitness", "workout", "cardio", "no equipment", "strength", "flexibility"],
+    ),
+    "Technology": (
+        ["Python", "Streamlit", "Docker", "React", "Rust", "SQL", "Kubernetes", "Gemini API"],
+        ["Project setup", "Installing dependencies", "Writing the first test", "Adding a sidebar",
+         "Deploying", "Debugging", "Refactoring", "API key setup"],
+        ["python", "tutorial", "ai", "web", "devops", "data", "machine learning"],
+    ),
+    "Music": (
+        ["guitar", "piano", "drums", "ukulele", "vocals", "bass", "violin", "synth"],
+        ["Tuning", "Finger position", "Chord transition", "Strumming pattern", "Scale practice",
+         "Full playthrough", "Slow practice"],
+        ["music", "beginner", "chords", "acoustic", "practice", "lesson"],
+    ),
+    "Art": (
+        ["watercolor", "charcoal", "oil painting", "ink", "sketching", "pottery", "calligraphy"],
+        ["Sky wash", "Blocking shapes", "Adding shadows", "Detail refinement", "Mixing colors",
+         "Final touches", "Layering"],
+        ["art", "painting", "landscape", "tutorial", "drawing", "portrait"],
+    ),
+}
+FILLER = ["first", "now", "then", "make sure", "slowly", "carefully", "next", "finally", "and", "we"]
+
+
+def generate_item(rng: random.Random, index: int) -> dict:
+    """Generate one synthetic gallery item."""
+    category = rng.choice(list(VOCABULARY))
+    subjects, action_names, tags = VOCABULARY[category]
+    subject = rng.choice(subjects)
+    is_video = rng.random() < 0.8
+    duration = rng.randint(120, 3600) if is_video else 0
+    n_actions = rng.randint(2, 6) if is_video else 1
+    offsets = sorted(rng.sample(range(max(duration, n_actions)), n_actions)) if is_video else [0]
+    actions = [
+        {
+            "name": rng.choice(action_names),
+            "start_time": format_timestamp(ts) if is_video else "N/A",
+            "timestamp_sec": ts,
+        }
+        for ts in offsets
+    ]
+    sentences = []
+    for a in actions if is_video else []:
+        words = rng.sample(FILLER, 3) + [a["name"].lower(), subject]
+        rng.shuffle(words)
+        sentences.append(" ".join(words).capitalize() + ".")
+    seed = f"{category.lower()}{index}"
+    item = {
+        "id": f"item_{index}_{category.lower()}",
+        "title": f"{subject.title()} {rng.choice(['Tutorial', 'Basics', 'Masterclass', 'Tips', 'in 10 Minutes'])} #{index}",
+        "category": category,
+        "type": "video" if is_video else "image",
+        "source": "https://www.youtube.com/embed/dQw4w9WgXcQ" if is_video else f"https://picsum.photos/seed/{seed}/800/600",
+        "thumbnail": f"https://picsum.photos/seed/{seed}/400/225",
+        "description": f"{category} {'video' if is_video else 'image'} about {subject}: "
+                       + ", ".join(a["name"].lower() for a in actions) + ".",
+        "actions": actions,
+        "transcript": " ".join(sentences),
+        "tags": rng.sample(tags, rng.randint(2, 4)) + [subject],
+    }
+    if is_video:
+        item["duration"] = format_timestamp(duration)
+    return item
+
+
+def generate_ratings(rng: random.Random, items: list, users: int = 1000, zipf_s: float = 1.1) -> dict:
+    """Zipf-distributed ratings {item_id: {user_id: rating}}: a few items get most votes."""
+    ranked = [i["id"] for i in items]
+    rng.shuffle(ranked)
+    ratings = {}
+    for rank, item_id in enumerate(ranked, 1):
+        n_raters = int(users / rank ** zipf_s)
+        if n_raters == 0:
+            if rng.random() > 0.3:
+                continue
+            n_raters = 1
+        quality = rng.uniform(2.0, 5.0)
+        ratings[item_id] = {
+            f"user_{u}": min(5, max(1, round(rng.gauss(quality, 0.8))))
+            for u in rng.sample(range(users), min(n_raters, users))
+        }
+    return ratings
+
+
+def generate_playlists(rng: random.Random, items: list, count: int = 20, max_size: int = 500) -> dict:
+    """Playlists of random item ids {playlist_name: [item_ids]}."""
+    ids = [i["id"] for i in items]
+    return {
+        f"Playlist {n + 1}": rng.sample(ids, rng.randint(1, min(max_size, len(ids))))
+        for n in range(count)
+    } if ids else {}
+
+
+def generate_gallery(count: int, seed: int = 42) -> tuple:
+    """Generate (items, ratings, playlists) deterministically for a seed."""
+    rng = random.Random(seed)
+    items = [generate_item(rng, n) for n in range(1, count + 1)]
+    return items, generate_ratings(rng, items), generate_playlists(rng, items)
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Generate sample gallery data.")
+    parser.add_argument("--count", type=int, help="generate this many synthetic items instead of the samples")
+    parser.add_argument("--seed", type=int, default=42, help="random seed for synthetic data")
+    args = parser.parse_args()
+
     DATA_DIR.mkdir(parents=True, exist_ok=True)
-    with open(METADATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(SAMPLE_ITEMS, f, indent=2, ensure_ascii=False)
+    if args.count:
+        items, ratings, playlists = generate_gallery(args.count, args.seed)
+        save_json(METADATA_FILE, items)
+        save_json(RATINGS_FILE, ratings)
+        save_json(PLAYLISTS_FILE, playlists)
+        print(f"Generated {len(items)} synthetic items, {len(ratings)} rated, "
+              f"{len(playlists)} playlists at {DATA_DIR} (seed {args.seed})")
+        return
+    save_json(METADATA_FILE, SAMPLE_ITEMS)
     print(f"Generated {len(SAMPLE_ITEMS)} sample items at {METADATA_FILE}")
 
 
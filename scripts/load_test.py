@@ -0,0 +1,235 @@
+"""Load-test the gallery HTTP API and report requests/sec and latency percentiles.
+
+Usage:
+    python scripts/load_test.py --count 100000 --duration 20 --concurrency 64
+    python scripts/load_test.py --url http://127.0.0.1:8000 --duration 10
+
+Without --url a synthetic gallery of --count items is generated into a
+temporary directory (MEDIA_DATA_DIR, never ./data) and `services.api` is
+started on a free port against it. Each client keeps one keep-alive
+connection and revalidates with If-None-Match like a caching HTTP client
+(--no-etag sends plain GETs). The request mix is weighted per MIX; requests
+during the first --warmup seconds (cold caches) are not counted.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from urllib.parse import quote, urlencode, urlsplit
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+MIX = {"browse": 35, "search": 20, "item": 33, "playlist": 10, "rate": 2}
+SEARCH_WORDS = ["pasta", "guitar", "workout", "sauce", "chords", "stretch", "paint", "code", "bread", "yoga"]
+SORTS = ["Relevance", "Title A-Z", "Rating", "Newest"]
+
+
+class Connection:
+    """Minimal HTTP/1.1 keep-alive client on asyncio streams."""
+
+    def __init__(self, host: str, port: int):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def request(self, method: str, target: str, body=None, headers=None) -> tuple:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        payload = json.dumps(body).encode("utf-8") if body is not None else b""
+        lines = [f"{method} {target} HTTP/1.1", f"Host: {self.host}", f"Content-Length: {len(payload)}"]
+        lines += [f"{k}: {v}" for k, v in (headers or {}).items()]
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + payload)
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        resp_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            resp_headers[name.strip().lower()] = value.strip()
+        data = await self.reader.readexactly(int(resp_headers.get("content-length", 0)))
+        if resp_headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, resp_headers, data
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+def make_request(rng: random.Random, kind: str, ids: list, categories: list, playlists: list) -> tuple:
+    """(method, target, body) for one request of the given kind."""
+    if kind == "browse":
+        params = {"category": rng.choice(categories), "sort": rng.choice(SORTS), "page": rng.randint(1, 5)}
+        return "GET", "/items?" + urlencode(params), None
+    if kind == "search":
+        params = {"q": rng.choice(SEARCH_WORDS), "page": rng.randint(1, 3)}
+        return "GET", "/items?" + urlencode(params), None
+    if kind == "item":
+        # Zipf-ish popularity: a few items get most of the views
+        return "GET", "/items/" + quote(ids[min(int(rng.paretovariate(1.2)) - 1, len(ids) - 1)], safe=""), None
+    if kind == "playlist" and playlists:
+        return "GET", f"/playlists/{quote(rng.choice(playlists), safe='')}?page={rng.randint(1, 3)}", None
+    item_id = quote(rng.choice(ids), safe="")
+    return "POST", f"/items/{item_id}/rating", {"rating": rng.randint(1, 5), "user_id": f"load_{rng.randint(1, 500)}"}
+
+
+async def client(n: int, host: str, port: int, measure_from: float, deadline: float, setup: dict,
+                 use_etag: bool, samples: dict) -> None:
+    rng = random.Random(n)
+    kinds, weights = list(MIX), list(MIX.values())
+    conn = Connection(host, port)
+    etags = {}
+    while time.perf_counter() < deadline:
+        kind = rng.choices(kinds, weights)[0]
+        method, target, body = make_request(rng, kind, setup["ids"], setup["categories"], setup["playlists"])
+        headers = {"If-None-Match": etags[target]} if use_etag and target in etags else None
+        t0 = time.perf_counter()
+        try:
+            status, resp_headers, _ = await conn.request(method, target, body, headers)
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError):
+            conn.close()
+            status, resp_headers = 0, {}
+        if t0 >= measure_from:
+            samples.setdefault(kind, []).append(((time.perf_counter() - t0) * 1000, status))
+        if "etag" in resp_headers:
+            etags[target] = resp_headers["etag"]
+    conn.close()
+
+
+async def fetch_setup(host: str, port: int) -> dict:
+    """Item ids, categories and playlist names to build requests from."""
+    conn = Connection(host, port)
+    ids = []
+    for page in range(1, 51):
+        _, _, data = await conn.request("GET", f"/items?per_page=100&page={page}")
+        batch = [i["id"] for i in json.loads(data)["items"]]
+        ids.extend(batch)
+        if len(batch) < 100:
+            break
+    _, _, data = await conn.request("GET", "/categories")
+    categories = ["All"] + json.loads(data)["categories"]
+    _, _, data = await conn.request("GET", "/playlists")
+    playlists = list(json.loads(data)["playlists"])
+    conn.close()
+    if not ids:
+        raise SystemExit("The gallery is empty; nothing to load-test")
+    return {"ids": ids, "categories": categories, "playlists": playlists}
+
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def summarize(samples: dict, elapsed: float) -> dict:
+    rows = {}
+    everything = []
+    for kind, values in sorted(samples.items()):
+        latencies = [ms for ms, _ in values]
+        everything.extend(values)
+        rows[kind] = {
+            "requests": len(values),
+            "p50_ms": round(statistics.median(latencies), 3),
+            "p99_ms": round(percentile(latencies, 0.99), 3),
+        }
+    latencies = [ms for ms, _ in everything]
+    statuses = {}
+    for _, status in everything:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        "requests": len(everything),
+        "seconds": round(elapsed, 2),
+        "requests_per_sec": round(len(everything) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies), 3) if latencies else 0,
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "statuses": statuses,
+        "by_kind": rows,
+    }
+
+
+async def run(host: str, port: int, args) -> dict:
+    setup = await fetch_setup(host, port)
+    samples = {}
+    start = time.perf_counter() + args.warmup
+    deadline = start + args.duration
+    await asyncio.gather(*(
+        client(n, host, port, start, deadline, setup, not args.no_etag, samples) for n in range(args.concurrency)
+    ))
+    return summarize(samples, time.perf_counter() - start)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(data_dir: str, port: int, workers: int) -> subprocess.Popen:
+    env = {**os.environ, "MEDIA_DATA_DIR": data_dir}
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "services.api", "--port", str(port), "--workers", str(workers)],
+        cwd=ROOT, env=env, stdout=subprocess.PIPE, text=True,
+    )
+    line = proc.stdout.readline()
+    if "listening" not in line:
+        proc.kill()
+        raise SystemExit(f"API server failed to start: {line.strip()}")
+    return proc
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the gallery HTTP API.")
+    parser.add_argument("--url", help="existing server to test instead of starting one")
+    parser.add_argument("--count", type=int, default=100_000, help="synthetic gallery size")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--concurrency", type=int, default=32, help="parallel keep-alive connections")
+    parser.add_argument("--duration", type=float, default=15, help="seconds to measure")
+    parser.add_argument("--warmup", type=float, default=10, help="seconds to run before measuring")
+    parser.add_argument("--workers", type=int, default=8, help="server thread-pool size")
+    parser.add_argument("--no-etag", action="store_true", help="don't send If-None-Match")
+    parser.add_argument("--out", type=Path, help="write the report as JSON")
+    args = parser.parse_args()
+
+    if args.url:
+        url = urlsplit(args.url)
+        report = asyncio.run(run(url.hostname, url.port or 80, args))
+    else:
+        with tempfile.TemporaryDirectory(prefix="media_load_") as tmp:
+            env = {**os.environ, "MEDIA_DATA_DIR": tmp}
+            t0 = time.perf_counter()
+            subprocess.run([sys.executable, str(ROOT / "scripts" / "generate_sample_data.py"),
+                            "--count", str(args.count), "--seed", str(args.seed)], env=env, check=True)
+            print(f"Generated in {time.perf_counter() - t0:.1f}s")
+            port = free_port()
+            server = start_server(tmp, port, args.workers)
+            try:
+                report = asyncio.run(run("127.0.0.1", port, args))
+            finally:
+                server.terminate()
+                server.wait()
+        report["count"] = args.count
+    report["concurrency"] = args.concurrency
+
+    print(f"\n{report['requests']} requests in {report['seconds']}s "
+          f"-> {report['requests_per_sec']} req/s, p50 {report['p50_ms']} ms, p99 {report['p99_ms']} ms")
+    print(f"statuses: {report['statuses']}")
+    for kind, row in report["by_kind"].items():
+        print(f"  {kind:<9} {row['requests']:>8}  p50 {row['p50_ms']:>9.3f} ms  p99 {row['p99_ms']:>9.3f} ms")
+    if args.out:
+        args.out.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,8 +7,10 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
 from config import GOOGLE_API_KEY, GROQ_API_KEY, AI_PROVIDER
+from services import metrics
 
 
+@metrics.timed("ai_service.get_video_summary_gemini")
 def get_video_summary_gemini(video_path: str = None, video_url: str = None, prompt: str = "") -> str:
     """Generate video summary using Google Gemini API."""
     if not GOOGLE_API_KEY:
@@ -38,6 +40,7 @@ def get_video_summary_gemini(video_path: str = None, video_url: str = None, prom
         return f"[Error] Gemini: {str(e)}"
 
 
+@metrics.timed("ai_service.get_text_summary_groq")
 def get_text_summary_groq(text: str, prompt: str = "Summarize:") -> str:
     """Generate text summary using Groq API (fast inference)."""
     if not GROQ_API_KEY:
@@ -61,6 +64,7 @@ def get_text_summary_groq(text: str, prompt: str = "Summarize:") -> str:
         return f"[Error] Groq: {str(e)}"
 
 
+@metrics.timed("ai_service.get_text_summary_gemini")
 def get_text_summary_gemini(text: str, prompt: str = "Summarize:") -> str:
     """Generate text summary using Google Gemini API."""
     if not GOOGLE_API_KEY:
@@ -83,6 +87,7 @@ def get_ai_summary(text: str, prompt: str = "Summarize:") -> str:
     return get_text_summary_gemini(text, prompt)
 
 
+@metrics.timed("ai_service.search_semantic")
 def search_semantic(query: str, items: list, text_field: str = "description") -> list:
     """Simple keyword-based search (AI-enhanced when API available)."""
     query_lower = query.lower().strip()
@@ -0,0 +1,289 @@
+"""Engagement analytics - rollups maintained incrementally on every write.
+
+ANALYTICS_FILE holds, for the whole gallery and per category and content
+type, the item count, rating count, rating sum and a 1-5 star histogram,
+plus a pool of top-rated candidates. save_rating / add_gallery_item /
+delete_gallery_item apply their delta to it through update_json, so the
+dashboard reads a file whose size depends on the number of categories, not
+on the size of the catalogue. Deltas commute, so several writer processes
+keep the counters exact.
+
+Top items are ranked by a damped average, (sum + PRIOR_WEIGHT * PRIOR_MEAN) /
+(count + PRIOR_WEIGHT), so a single 5-star vote does not outrank a
+consistently well-rated item. The pool holds every item scoring above
+`top_threshold`; a rating moves only that item in or out, the pool is
+trimmed back to POOL_SIZE when it doubles, and only when it shrinks below
+TOP_N is it refilled from all ratings.
+
+A rebuild reads and computes while holding the ANALYTICS_FILE lock, so deltas
+from other processes wait and land on its result rather than being lost.
+Deltas are applied just after their data write, though, so one whose write
+lands while a rebuild is reading the files can still be counted twice;
+`--verify` reports that and the next rebuild clears it.
+
+data_service loads this module before notifying, so every writing process
+(app, API, bulk import) applies its deltas. gallery_replaced (clear, bulk
+import) marks the rollups stale and the next read rebuilds them. After writing the data files directly (e.g.
+generate_sample_data.py) run `python -m services.analytics --rebuild`;
+`--verify` compares the rollups a read would return with a full recompute.
+"""
+import heapq
+import threading
+import time
+from typing import Optional
+
+from config import ANALYTICS_FILE
+from services import data_service, metrics
+from services.data_service import get_gallery_version, get_gallery_view, get_ratings, load_json, update_json
+
+TOP_N = 10
+POOL_SIZE = 50
+PRIOR_WEIGHT = 3
+PRIOR_MEAN = 3.0
+STARS = 5
+
+_lock = threading.Lock()
+_meta = {"version": None, "items": {}}  # item_id -> (category, type, title), for rating events
+_cache = {"version": None, "data": None}
+
+
+def score(count: int, total: float) -> float:
+    """Damped average rating used to rank top items."""
+    return round((total + PRIOR_WEIGHT * PRIOR_MEAN) / (count + PRIOR_WEIGHT), 4)
+
+
+def average(group: dict) -> Optional[float]:
+    return round(group["rating_sum"] / group["ratings"], 2) if group["ratings"] else None
+
+
+def _describe(item: dict) -> tuple:
+    return item.get("category", "Other"), item.get("type", "video"), item.get("title", "")
+
+
+def _group() -> dict:
+    return {"items": 0, "ratings": 0, "rating_sum": 0, "histogram": [0] * STARS}
+
+
+def _groups(rollups: dict, category: str, content_type: str) -> list:
+    return [
+        rollups["overall"],
+        rollups["by_category"].setdefault(category, _group()),
+        rollups["by_type"].setdefault(content_type, _group()),
+    ]
+
+
+def _count_ratings(group: dict, values, sign: int = 1) -> None:
+    for rating in values:
+        group["ratings"] += sign
+        group["rating_sum"] += sign * rating
+        group["histogram"][min(max(int(round(rating)), 1), STARS) - 1] += sign
+
+
+def _prune(rollups: dict, category: str, content_type: str) -> None:
+    """Drop groups left empty, as a rebuild would not create them."""
+    for key, name in (("by_category", category), ("by_type", content_type)):
+        group = rollups[key].get(name)
+        if group is not None and not group["items"] and not group["ratings"]:
+            del rollups[key][name]
+
+
+def _fill_pool(rollups: dict, candidates: list) -> None:
+    """Keep the POOL_SIZE best of (score, item_id, [count, sum, title])."""
+    best = heapq.nlargest(POOL_SIZE, candidates, key=lambda c: c[0])
+    rollups["top_pool"] = {item_id: entry for _, item_id, entry in best}
+    rollups["top_threshold"] = best[-1][0] if len(best) == POOL_SIZE else 0
+
+
+def _place(rollups: dict, item_id: str, count: int, total: float, title: str) -> None:
+    """Move one item in or out of the top pool after its ratings changed."""
+    pool = rollups["top_pool"]
+    if count and score(count, total) > rollups["top_threshold"]:
+        pool[item_id] = [count, total, title]
+    else:
+        pool.pop(item_id, None)
+    if len(pool) > 2 * POOL_SIZE:
+        _fill_pool(rollups, [(score(c, t), i, [c, t, name]) for i, (c, t, name) in pool.items()])
+
+
+def _needs_refill(rollups: dict) -> bool:
+    # Items at or below the threshold aren't tracked, so a short pool may hide some
+    return len(rollups["top_pool"]) < TOP_N and rollups["top_threshold"] > 0
+
+
+def compute(items, ratings: dict) -> dict:
+    """Rollups from scratch - one pass over the gallery."""
+    rollups = {"overall": _group(), "by_category": {}, "by_type": {}, "top_pool": {}, "top_threshold": 0}
+    candidates = []
+    for item in items:
+        category, content_type, title = _describe(item)
+        values = list(ratings.get(item.get("id"), {}).values())
+        for group in _groups(rollups, category, content_type):
+            group["items"] += 1
+            _count_ratings(group, values)
+        if values:
+            candidates.append((score(len(values), sum(values)), item.get("id"), [len(values), sum(values), title]))
+    _fill_pool(rollups, candidates)
+    return rollups
+
+
+def rebuild() -> dict:
+    """Full recompute from the data files; writes ANALYTICS_FILE."""
+    def replace(rollups):
+        # Read and compute under the file lock, so a delta another process
+        # applies meanwhile waits and lands on the new rollups instead of
+        # being overwritten by them
+        version = get_gallery_version()
+        items = get_gallery_view()
+        _meta["items"] = {i.get("id"): _describe(i) for i in items}
+        _meta["version"] = version
+        fresh = compute(items, get_ratings())
+        fresh["rebuilt_at"] = time.time()
+        rollups.clear()
+        rollups.update(fresh)
+        return fresh
+
+    with _lock, metrics.span("analytics.rebuild"):
+        return update_json(ANALYTICS_FILE, replace, {})
+
+
+def _refill() -> None:
+    """Refill a short top pool from all ratings (rare)."""
+    ratings = get_ratings()
+    candidates = []
+    for item_id, (_, _, title) in _item_map().items():
+        values = list(ratings.get(item_id, {}).values())
+        if values:
+            candidates.append((score(len(values), sum(values)), item_id, [len(values), sum(values), title]))
+    update_json(ANALYTICS_FILE, lambda rollups: _fill_pool(rollups, candidates), {})
+
+
+def _item_map() -> dict:
+    """{item_id: (category, type, title)}, reloaded when the gallery file changed."""
+    version = get_gallery_version()
+    if _meta["version"] != version:
+        _meta["items"] = {i.get("id"): _describe(i) for i in get_gallery_view()}
+        _meta["version"] = version
+    return _meta["items"]
+
+
+def _lookup(item_id: str) -> Optional[tuple]:
+    """(category, type, title) of an item; the map is only reloaded on a miss."""
+    return _meta["items"].get(item_id) or _item_map().get(item_id)
+
+
+def _on_change(event: str, **details) -> None:
+    if not ANALYTICS_FILE.exists():
+        return  # nothing to maintain yet; the first read builds it
+    with _lock, metrics.span(f"analytics.{event}"):
+        if event == "gallery_replaced":
+            _meta["version"] = None
+            _meta["items"] = {}
+            update_json(ANALYTICS_FILE, lambda rollups: rollups.update(stale=True), {})
+            return
+        if event == "rating_saved":
+            item_id = details["item_id"]
+            described = _lookup(item_id)
+            if described is None:
+                return
+            category, content_type, title = described
+            previous, rating = details["previous"], details["rating"]
+            values = list((details.get("ratings") or {}).values())
+
+            def apply(rollups):
+                for group in _groups(rollups, category, content_type):
+                    if previous is not None:
+                        _count_ratings(group, [previous], -1)
+                    _count_ratings(group, [rating])
+                _place(rollups, item_id, len(values), sum(values), title)
+        elif event == "item_added":
+            item = details["item"]
+            category, content_type, title = _describe(item)
+            _meta["items"][item.get("id")] = (category, content_type, title)
+
+            def apply(rollups):
+                for group in _groups(rollups, category, content_type):
+                    group["items"] += 1
+        elif event == "item_deleted":
+            item = details["item"]
+            item_id = item.get("id")
+            category, content_type, _ = _describe(item)
+            values = list((details.get("ratings") or {}).values())
+            _meta["items"].pop(item_id, None)
+
+            def apply(rollups):
+                for group in _groups(rollups, category, content_type):
+                    group["items"] -= 1
+                    _count_ratings(group, values, -1)
+                rollups["top_pool"].pop(item_id, None)
+                _prune(rollups, category, content_type)
+        else:
+            return
+
+        def guarded(rollups):
+            if not rollups or rollups.get("stale"):
+                return False  # the next read rebuilds everything anyway
+            apply(rollups)
+            return _needs_refill(rollups)
+
+        if update_json(ANALYTICS_FILE, guarded, {}):
+            _refill()
+
+
+data_service.subscribe(_on_change)
+
+
+def get_rollups() -> dict:
+    """Current rollups: a small file read, rebuilt first if missing or stale."""
+    try:
+        version = ANALYTICS_FILE.stat().st_mtime_ns
+    except FileNotFoundError:
+        version = None
+    if version is not None and _cache["version"] == version:
+        return _cache["data"]
+    data = load_json(ANALYTICS_FILE, {}) if version is not None else {}
+    if not data or data.get("stale"):
+        data = rebuild()
+        version = ANALYTICS_FILE.stat().st_mtime_ns
+    _cache["data"], _cache["version"] = data, version
+    return data
+
+
+def top_items(rollups: dict, n: int = TOP_N) -> list:
+    """Best n items of the top pool as dicts, best first."""
+    best = heapq.nlargest(n, rollups["top_pool"].items(), key=lambda kv: (score(kv[1][0], kv[1][1]), kv[1][0]))
+    return [
+        {"item_id": item_id, "title": title, "ratings": count,
+         "avg_rating": round(total / count, 2), "score": score(count, total)}
+        for item_id, (count, total, title) in best
+    ]
+
+
+def verify() -> list:
+    """Differences between the current rollups and a full recompute (empty if none)."""
+    stored = get_rollups()  # rebuilt first if stale, as the dashboard would
+    fresh = compute(get_gallery_view(), get_ratings())
+    problems = []
+    for key in ("overall", "by_category", "by_type"):
+        if stored.get(key) != fresh[key]:
+            problems.append(f"{key}: stored {stored.get(key)} != recomputed {fresh[key]}")
+    stored_top = [t["score"] for t in top_items(stored)] if stored.get("top_pool") is not None else None
+    fresh_top = [t["score"] for t in top_items(fresh)]
+    if stored_top != fresh_top:
+        problems.append(f"top scores: stored {stored_top} != recomputed {fresh_top}")
+    return problems
+
+
+if __name__ == "__main__":
+    import sys
+
+    if "--rebuild" in sys.argv:
+        t0 = time.perf_counter()
+        rollups = rebuild()
+        print(f"Analytics for {rollups['overall']['items']} items, {rollups['overall']['ratings']} ratings "
+              f"in {time.perf_counter() - t0:.1f}s -> {ANALYTICS_FILE}")
+    elif "--verify" in sys.argv:
+        problems = verify()
+        print("\n".join(problems) if problems else "Rollups match a full recompute")
+        sys.exit(1 if problems else 0)
+    else:
+        print("Usage: python -m services.analytics --rebuild | --verify")
@@ -0,0 +1,486 @@
+"""Headless HTTP/JSON API over the gallery services.
+
+    python -m services.api --port 8000
+
+Endpoints (JSON in and out; page numbers are 1-based):
+
+    GET    /health
+    GET    /categories
+    GET    /items?q=&category=&type=&sort=&page=&per_page=
+    GET    /items/{id}
+    POST   /items/{id}/rating              {"rating": 1-5, "user_id": "..."}
+    GET    /playlists
+    GET    /playlists/{name}?page=&per_page=
+    PUT    /playlists/{name}               {"item_ids": [...]}   create / replace
+    POST   /playlists/{name}/items         {"item_ids": [...]}   append
+    DELETE /playlists/{name}/items/{id}
+    DELETE /playlists/{name}
+
+The server is a small HTTP/1.1 (keep-alive) loop on asyncio streams, so it
+needs nothing beyond the standard library. data_service reads and writes
+block, so every handler runs on a thread pool and the event loop only parses
+requests and writes responses. Request bodies must be framed by
+Content-Length: an invalid one gets 400 and a Transfer-Encoding 501, and
+either closes the connection.
+
+GET responses carry an ETag and are cached per URL together with the
+version (stat) of the data files the route reads. While those files are
+unchanged a repeated GET is answered from the cache without touching the
+thread pool, and a matching If-None-Match gets a 304 with no body. The parsed
+gallery, its id map and recent filter/sort results are kept per gallery
+version, so paging through one result list filters it only once.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Optional
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from config import PLAYLISTS_FILE, RATINGS_FILE
+from services import data_service
+from services.data_service import get_gallery_version, get_gallery_view
+from services.gallery_service import SORT_OPTIONS, filter_and_sort
+from services.playlist_service import get_all_playlists, get_playlist
+from services.shared_snapshot import SharedGallery
+
+DEFAULT_PER_PAGE = 20
+MAX_PER_PAGE = 100
+MAX_BODY = 1 << 20
+RESPONSE_CACHE_SIZE = 1024
+FILTER_CACHE_SIZE = 64
+RATING_SORT_MAX_AGE = 5.0
+
+logger = logging.getLogger(__name__)
+
+
+class ApiError(Exception):
+    """Raised by handlers to return an error status with a message."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _mtime(path) -> int:
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def data_version(deps: tuple = ("gallery", "ratings", "playlists")) -> tuple:
+    """Changes whenever one of the data files in `deps` is rewritten."""
+    stamps = {
+        "gallery": get_gallery_version,
+        "ratings": lambda: _mtime(RATINGS_FILE),
+        "playlists": lambda: _mtime(PLAYLISTS_FILE),
+    }
+    return tuple(stamps[d]() for d in deps)
+
+
+# Gallery-derived data kept in memory between requests, dropped when the file changes
+_gallery = {"version": None, "items": None, "derived": {}}
+_gallery_lock = threading.Lock()
+_ratings = {"version": None, "data": {}}
+_filtered = OrderedDict()  # (gallery version, query, category, type, sort) -> (ratings version, built at, items)
+_filter_locks = {}  # key -> lock held while that result is computed
+_served = threading.local()  # .stale: the handler served a list older than the ratings file
+
+
+def _gallery_items():
+    version = get_gallery_version()
+    with _gallery_lock:
+        if _gallery["version"] != version:
+            _gallery["items"] = get_gallery_view()
+            _gallery["derived"] = {}
+            _gallery["version"] = version
+        return _gallery["items"]
+
+
+def _derived(name: str, build):
+    """build(items), computed once per gallery version."""
+    items = _gallery_items()
+    with _gallery_lock:
+        derived = _gallery["derived"]
+        if name not in derived or _gallery["items"] is not items:
+            derived[name] = build(items)
+        return derived[name]
+
+
+def _find_item(item_id: str) -> Optional[dict]:
+    items = _gallery_items()
+    if isinstance(items, SharedGallery):
+        return items.get(item_id)
+    return _derived("by_id", lambda items: {i.get("id"): i for i in items}).get(item_id)
+
+
+def _categories() -> list:
+    def build(items):
+        if isinstance(items, SharedGallery):
+            return sorted(items.facet_values("category"))
+        return sorted(set(i.get("category", "Other") for i in items))
+
+    return _derived("categories", build)
+
+
+def _filter_and_sort(query: str, category: str, content_type: str, sort_by: str) -> list:
+    """filter_and_sort, memoized so the pages of one result list share a single pass.
+
+    A Rating-sorted list is reused for up to RATING_SORT_MAX_AGE seconds after
+    ratings change, so a stream of ratings doesn't re-sort the gallery per write.
+    Serving such a list sets _served.stale, so the response isn't cached under
+    the new ratings version.
+    """
+    ratings_version = _mtime(RATINGS_FILE) if sort_by == "Rating" else 0
+    key = (get_gallery_version(), query, category, content_type, sort_by)
+
+    def reuse(entry):
+        if entry is None:
+            return False
+        if entry[0] == ratings_version:
+            return True
+        if time.monotonic() - entry[1] < RATING_SORT_MAX_AGE:
+            _served.stale = True
+            return True
+        return False
+
+    with _gallery_lock:
+        entry = _filtered.get(key)
+        if reuse(entry):
+            _filtered.move_to_end(key)
+            return entry[2]
+        building = _filter_locks.setdefault(key, threading.Lock())
+    # Concurrent requests for the same list wait for one computation
+    with building:
+        try:
+            with _gallery_lock:
+                entry = _filtered.get(key)
+                if reuse(entry):
+                    return entry[2]
+            items = filter_and_sort(_gallery_items(), category, content_type, sort_by, query)
+            with _gallery_lock:
+                _filtered[key] = (ratings_version, time.monotonic(), items)
+                _filtered.move_to_end(key)
+                while len(_filtered) > FILTER_CACHE_SIZE:
+                    _filtered.popitem(last=False)
+        finally:
+            with _gallery_lock:
+                if _filter_locks.get(key) is building:
+                    del _filter_locks[key]
+    return items
+
+
+def _avg_rating(item_id: str) -> Optional[float]:
+    """Same result as data_service.get_avg_rating without re-reading the file per call."""
+    version = _mtime(RATINGS_FILE)
+    with _gallery_lock:
+        if _ratings["version"] != version:
+            _ratings["data"] = data_service.get_ratings()
+            _ratings["version"] = version
+        vals = list(_ratings["data"].get(item_id, {}).values())
+    return round(sum(vals) / len(vals), 1) if vals else None
+
+
+def _int_param(params: dict, name: str, default: int, lo: int, hi: int) -> int:
+    raw = params.get(name, str(default))
+    try:
+        value = int(raw)
+    except ValueError:
+        raise ApiError(400, f"'{name}' must be an integer")
+    if not lo <= value <= hi:
+        raise ApiError(400, f"'{name}' must be between {lo} and {hi}")
+    return value
+
+
+def _paginate(items, params: dict) -> dict:
+    per_page = _int_param(params, "per_page", DEFAULT_PER_PAGE, 1, MAX_PER_PAGE)
+    pages = max(1, -(-len(items) // per_page))
+    page = _int_param(params, "page", 1, 1, 1 << 31)
+    start = (page - 1) * per_page
+    return {"total": len(items), "page": page, "per_page": per_page, "pages": pages,
+            "items": list(items[start:start + per_page])}
+
+
+def _item_ids(body) -> list:
+    ids = body.get("item_ids") if isinstance(body, dict) else None
+    if not isinstance(ids, list) or not all(isinstance(i, str) for i in ids):
+        raise ApiError(400, "body must be {\"item_ids\": [\"...\"]}")
+    return ids
+
+
+# Handlers: (params, body, *path_args) -> (status, payload). They run on the pool.
+
+def health(params, body):
+    return 200, {"status": "ok"}
+
+
+def list_categories(params, body):
+    return 200, {"categories": _categories()}
+
+
+def list_items(params, body):
+    sort_by = params.get("sort", "Relevance")
+    if sort_by not in SORT_OPTIONS:
+        raise ApiError(400, f"'sort' must be one of {SORT_OPTIONS}")
+    items = _filter_and_sort(
+        params.get("q", "").strip(),
+        params.get("category", "All"),
+        params.get("type", "All"),
+        sort_by,
+    )
+    return 200, _paginate(items, params)
+
+
+def get_item(params, body, item_id):
+    item = _find_item(item_id)
+    if item is None:
+        raise ApiError(404, f"no item '{item_id}'")
+    return 200, {**item, "avg_rating": _avg_rating(item_id)}
+
+
+def rate_item(params, body, item_id):
+    if not isinstance(body, dict):
+        raise ApiError(400, "body must be a JSON object")
+    rating = body.get("rating")
+    if not isinstance(rating, int) or isinstance(rating, bool) or not 1 <= rating <= 5:
+        raise ApiError(400, "'rating' must be an integer from 1 to 5")
+    user_id = str(body.get("user_id") or "default")
+    if _find_item(item_id) is None:
+        raise ApiError(404, f"no item '{item_id}'")
+    data_service.save_rating(item_id, rating, user_id)
+    return 200, {"item_id": item_id, "user_id": user_id, "rating": rating,
+                 "avg_rating": _avg_rating(item_id)}
+
+
+def list_playlists(params, body):
+    return 200, {"playlists": {name: len(p) for name, p in get_all_playlists().items()}}
+
+
+def get_playlist_page(params, body, name):
+    if name not in get_all_playlists():
+        raise ApiError(404, f"no playlist '{name}'")
+    page = _paginate(get_playlist(name).ids, params)
+    page["items"] = [item for item in map(_find_item, page["items"]) if item is not None]
+    return 200, {"name": name, **page}
+
+
+def put_playlist(params, body, name):
+    ids = _item_ids(body)
+    created = name not in get_all_playlists()
+    data_service.save_playlist(name, ids)
+    return (201 if created else 200), {"name": name, "count": len(dict.fromkeys(ids))}
+
+
+def add_playlist_items(params, body, name):
+    return 200, {"name": name, "added": data_service.add_items_to_playlist(name, _item_ids(body))}
+
+
+def remove_playlist_item(params, body, name, item_id):
+    if name not in get_all_playlists():
+        raise ApiError(404, f"no playlist '{name}'")
+    return 200, {"name": name, "removed": data_service.remove_from_playlist(name, [item_id])}
+
+
+def delete_playlist(params, body, name):
+    if not data_service.delete_playlist(name):
+        raise ApiError(404, f"no playlist '{name}'")
+    return 200, {"name": name, "deleted": True}
+
+
+# (method, path pattern, handler, data files a GET response depends on)
+ROUTES = [
+    ("GET", r"/health", health, ()),
+    ("GET", r"/categories", list_categories, ("gallery",)),
+    ("GET", r"/items", list_items, ("gallery", "ratings")),
+    ("GET", r"/items/([^/]+)", get_item, ("gallery", "ratings")),
+    ("POST", r"/items/([^/]+)/rating", rate_item, ()),
+    ("GET", r"/playlists", list_playlists, ("playlists",)),
+    ("GET", r"/playlists/([^/]+)", get_playlist_page, ("gallery", "playlists")),
+    ("PUT", r"/playlists/([^/]+)", put_playlist, ()),
+    ("POST", r"/playlists/([^/]+)/items", add_playlist_items, ()),
+    ("DELETE", r"/playlists/([^/]+)/items/([^/]+)", remove_playlist_item, ()),
+    ("DELETE", r"/playlists/([^/]+)", delete_playlist, ()),
+]
+_ROUTES = [(method, re.compile(pattern + r"/?"), handler, deps) for method, pattern, handler, deps in ROUTES]
+
+
+def _route(method: str, path: str):
+    """(handler, path args, deps) for a request; raises 404 / 405."""
+    allowed = []
+    for route_method, pattern, handler, deps in _ROUTES:
+        match = pattern.fullmatch(path)
+        if match:
+            if route_method == method:
+                return handler, [unquote(a) for a in match.groups()], deps
+            allowed.append(route_method)
+    if allowed:
+        raise ApiError(405, f"use {', '.join(allowed)} for {path}")
+    raise ApiError(404, f"no route for {path}")
+
+
+def _run_get(handler, params, args) -> tuple:
+    """(payload, stale) of a GET handler; runs on the pool."""
+    _served.stale = False
+    _, payload = handler(params, None, *args)
+    return payload, _served.stale
+
+
+def _encode(payload) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    return header.strip() == "*" or etag in (t.strip().removeprefix("W/") for t in header.split(","))
+
+
+class ApiServer:
+    """Request dispatch, thread pool and the per-URL GET response cache."""
+
+    def __init__(self, workers: int = 8):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api")
+        self._cache = OrderedDict()  # target -> (data version, etag, body)
+        self._building = {}  # (target, data version) -> future of a cache entry
+
+    async def _call(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+
+    async def dispatch(self, method: str, target: str, headers: dict, raw_body: bytes) -> tuple:
+        """(status, extra headers, body bytes) for one request."""
+        try:
+            url = urlsplit(target)
+            handler, args, deps = _route(method, url.path)
+            params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            if method != "GET":
+                try:
+                    body = json.loads(raw_body) if raw_body.strip() else {}
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    raise ApiError(400, "request body is not valid JSON")
+                status, payload = await self._call(handler, params, body, *args)
+                return status, {}, _encode(payload)
+            return await self._get(target, handler, params, args, deps, headers)
+        except ApiError as e:
+            return e.status, {}, _encode({"error": str(e)})
+        except Exception as e:  # a bug in one handler must not take the server down
+            logger.exception("api: %s %s failed", method, target)
+            return 500, {}, _encode({"error": f"internal error: {e}"})
+
+    async def _get(self, target, handler, params, args, deps, headers) -> tuple:
+        version = data_version(deps)  # a few stat() calls; cheap enough for the loop
+        cached = self._cache.get(target)
+        if cached is not None and cached[0] == version:
+            self._cache.move_to_end(target)
+        else:
+            # Requests arriving while the same response is being built share it
+            key = (target, version)
+            pending = self._building.get(key)
+            if pending is None:
+                pending = self._building[key] = asyncio.ensure_future(self._build(target, version, handler, params, args))
+                pending.add_done_callback(lambda _: self._building.pop(key, None))
+            cached = await asyncio.shield(pending)
+        _, etag, body = cached
+        extra = {"ETag": etag, "Cache-Control": "no-cache"}
+        if _etag_matches(headers.get("if-none-match", ""), etag):
+            return 304, extra, b""
+        return 200, extra, body
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serve requests on one keep-alive connection until it closes."""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line.strip():
+                    break
+                try:
+                    method, target, version = line.decode("latin-1").split()
+                except ValueError:
+                    await self._respond(writer, 400, {}, _encode({"error": "bad request line"}), False)
+                    break
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = header.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                if "transfer-encoding" in headers:
+                    # Bodies are only framed by Content-Length; the rest of a chunked
+                    # body would be parsed as the next request
+                    await self._respond(writer, 501, {}, _encode({"error": "Transfer-Encoding is not supported, "
+                                                                  "send Content-Length"}), False)
+                    break
+                length = headers.get("content-length", "0") or "0"
+                if not (length.isascii() and length.isdigit()):
+                    await self._respond(writer, 400, {}, _encode({"error": "invalid Content-Length"}), False)
+                    break
+                length = int(length)
+                if length > MAX_BODY:
+                    await self._respond(writer, 413, {}, _encode({"error": "request body too large"}), False)
+                    break
+                raw_body = await reader.readexactly(length) if length else b""
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                status, extra, body = await self.dispatch(method.upper(), target, headers, raw_body)
+                await self._respond(writer, status, extra, body, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _build(self, target, version, handler, params, args) -> tuple:
+        payload, stale = await self._call(_run_get, handler, params, args)
+        body = _encode(payload)
+        entry = (version, _etag(body), body)
+        # A body built from a list older than `version` must not be cached under
+        # it, or it would be served until the next write
+        if not stale:
+            self._cache[target] = entry
+            if len(self._cache) > RESPONSE_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return entry
+
+    @staticmethod
+    async def _respond(writer, status: int, extra: dict, body: bytes, keep_alive: bool) -> None:
+        lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}"]
+        if status != 304:
+            lines.append("Content-Type: application/json; charset=utf-8")
+        lines.append(f"Content-Length: {len(body)}")
+        lines.append("Connection: " + ("keep-alive" if keep_alive else "close"))
+        lines.extend(f"{k}: {v}" for k, v in extra.items())
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+
+async def serve(host: str = "127.0.0.1", port: int = 8000, workers: int = 8) -> None:
+    api = ApiServer(workers)
+    server = await asyncio.start_server(api.handle_connection, host, port)
+    bound = ", ".join(f"{s.getsockname()[0]}:{s.getsockname()[1]}" for s in server.sockets)
+    print(f"Gallery API listening on {bound}", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve the gallery over HTTP/JSON.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=8, help="threads for blocking data_service calls")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers))
+    except KeyboardInterrupt:
+        pass
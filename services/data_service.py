@@ -1,16 +1,28 @@
 """Data service for gallery metadata, ratings, playlists."""
+import importlib
 import json
+import logging
+import os
+import threading
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Optional, Sequence
 
 from config import (
     DATA_DIR,
+    WRITE_GROUP_WINDOW_MS,
     METADATA_FILE,
     RATINGS_FILE,
     PLAYLISTS_FILE,
     UPLOADS_DIR,
     GALLERY_DIR,
+    SHARED_SNAPSHOT,
 )
+from services import metrics, shared_snapshot
+from services.storage import GroupCommitWriter, Unchanged, atomic_write, file_lock
+
+# Collections larger than this are written without indentation: the indented
+# encoder is pure Python and dominates save time on big galleries.
+PRETTY_JSON_MAX_ITEMS = 5000
 
 
 def load_json(path: Path, default: Any = None) -> Any:
@@ -19,18 +31,143 @@ def load_json(path: Path, default: Any = None) -> Any:
         default = []
     try:
         if path.exists():
-            with open(path, "r", encoding="utf-8") as f:
-                return json.load(f)
-    except (json.JSONDecodeError, IOError):
+            with metrics.span("data_service.load_json") as sp:
+                with open(path, "rb") as f:
+                    raw = f.read()
+                sp.add_bytes(read=len(raw))
+                return json.loads(raw)
+    except (json.JSONDecodeError, UnicodeDecodeError, IOError):
         pass
     return default if default is not None else {}
 
 
+def _read_for_update(path: Path, default: Any) -> Any:
+    """Load JSON for a read-modify-write. Unlike load_json, a corrupt file raises
+    instead of being replaced by the default and overwritten."""
+    if not path.exists():
+        return default
+    with metrics.span("data_service.load_json") as sp:
+        with open(path, "rb") as f:
+            raw = f.read()
+        sp.add_bytes(read=len(raw))
+        return json.loads(raw) if raw.strip() else default
+
+
+def _file_version(path: Path) -> Optional[tuple]:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+# Member sets of playlists as last written by this process, valid while the file
+# is at `version`, so adding to a long playlist doesn't rebuild a set from its
+# whole id list on every call. Only touched under file_lock(PLAYLISTS_FILE).
+_playlist_members = {"version": None, "sets": {}}
+
+
+def _members(playlists: dict, name: str) -> set:
+    """Member set of playlists[name], from inside a playlists mutation."""
+    version = _file_version(PLAYLISTS_FILE)  # the file this batch was loaded from
+    if _playlist_members["version"] != version:
+        _playlist_members["version"] = version
+        _playlist_members["sets"] = {}
+    members = _playlist_members["sets"].get(name)
+    if members is None:
+        members = _playlist_members["sets"][name] = set(playlists.get(name, ()))
+    return members
+
+
+def _forget_members(name: str = None) -> None:
+    """Drop cached member sets after a playlists mutation other than an append."""
+    if name is None:
+        _playlist_members["sets"].clear()
+    else:
+        _playlist_members["sets"].pop(name, None)
+
+
+def _write_json(path: Path, data: Any) -> None:
+    """Encode and atomically replace path. Caller holds the file lock."""
+    with metrics.span("data_service.save_json") as sp:
+        indent = 2 if len(data) <= PRETTY_JSON_MAX_ITEMS else None
+        payload = json.dumps(data, indent=indent, ensure_ascii=False).encode("utf-8")
+        before = _file_version(path)
+        try:
+            atomic_write(path, payload)
+        except BaseException:
+            if path == PLAYLISTS_FILE:
+                _playlist_members["version"] = None  # sets were updated for data never written
+            raise
+        sp.add_bytes(written=len(payload))
+    if path == PLAYLISTS_FILE:
+        # The cached sets describe what was just written only if they described
+        # what was loaded
+        if _playlist_members["version"] == before:
+            _playlist_members["version"] = _file_version(path)
+        else:
+            _playlist_members["version"] = None
+    if SHARED_SNAPSHOT and path == METADATA_FILE:
+        with metrics.span("data_service.publish_snapshot"):
+            shared_snapshot.publish(SHARED_SNAPSHOT, data, os.stat(path).st_mtime_ns)
+
+
+_writer = GroupCommitWriter(_read_for_update, _write_json, WRITE_GROUP_WINDOW_MS / 1000)
+_listeners = []
+# Modules that keep derived data current from change events. They subscribe
+# when imported, and _notify imports them first, so every writer (app, API,
+# scripts) maintains them whether or not it uses them itself.
+DERIVED_MODULES = ("services.analytics", "services.recommender")
+_derived = {"loaded": False}
+_derived_lock = threading.Lock()
+logger = logging.getLogger(__name__)
+
+
+def subscribe(callback) -> None:
+    """Register callback(event: str, **details) to run after each committed change.
+
+    Events: "rating_saved" (item_id, user_id, rating, previous, ratings - the
+    item's {user_id: rating} after the write), "item_added" (item, base),
+    "item_deleted" (item, ratings, base), "gallery_replaced" (). `base` is the
+    get_gallery_version() the change was applied to.
+    """
+    if callback not in _listeners:
+        _listeners.append(callback)
+
+
+def _load_derived() -> None:
+    with _derived_lock:
+        if _derived["loaded"]:
+            return
+        for name in DERIVED_MODULES:
+            try:
+                importlib.import_module(name)
+            except Exception:
+                logger.exception("could not load %s", name)
+        _derived["loaded"] = True
+
+
+def _notify(event: str, **details) -> None:
+    _load_derived()
+    for callback in list(_listeners):
+        try:
+            callback(event, **details)
+        except Exception:
+            # Derived data (indexes, rollups) must never fail the write itself
+            logger.exception("listener %r failed on %s", callback, event)
+
+
 def save_json(path: Path, data: Any) -> None:
-    """Save data to JSON file."""
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    """Save data to JSON file (atomic, under the file lock)."""
+    with file_lock(path):
+        if path == PLAYLISTS_FILE:
+            _forget_members()  # replaced wholesale
+        _write_json(path, data)
+
+
+def update_json(path: Path, mutate, default: Any) -> Any:
+    """Apply mutate(data) to a JSON file in place via a group commit; returns mutate's result."""
+    return _writer.update(path, mutate, default)
 
 
 def get_gallery_items() -> list:
@@ -38,9 +175,78 @@ def get_gallery_items() -> list:
     return load_json(METADATA_FILE, [])
 
 
+def _shared_gallery() -> Optional[shared_snapshot.SharedGallery]:
+    """Current shared snapshot, (re)publishing it if missing or older than the file."""
+    snap = shared_snapshot.current(SHARED_SNAPSHOT)
+    try:
+        mtime = os.stat(METADATA_FILE).st_mtime_ns
+    except FileNotFoundError:
+        mtime = 0
+    if snap is not None and snap.source_mtime == mtime:
+        return snap
+    with file_lock(METADATA_FILE):
+        # Another process may have published while we waited for the lock
+        snap = shared_snapshot.current(SHARED_SNAPSHOT)
+        if snap is None or snap.source_mtime != mtime:
+            with metrics.span("data_service.publish_snapshot"):
+                shared_snapshot.publish(SHARED_SNAPSHOT, get_gallery_items(), mtime)
+            snap = shared_snapshot.current(SHARED_SNAPSHOT)
+    return snap
+
+
+def get_gallery_version() -> tuple:
+    """Token that changes whenever gallery metadata is rewritten."""
+    try:
+        st = os.stat(METADATA_FILE)
+    except FileNotFoundError:
+        return (0, 0)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def get_gallery_view() -> Sequence:
+    """Gallery items for read-only use: the shared snapshot when enabled, else a list."""
+    if SHARED_SNAPSHOT:
+        snap = _shared_gallery()
+        if snap is not None:
+            return snap
+    return get_gallery_items()
+
+
+def get_gallery_item(item_id: str) -> Optional[dict]:
+    """Get a single gallery item by id."""
+    items = get_gallery_view()
+    if isinstance(items, shared_snapshot.SharedGallery):
+        return items.get(item_id)
+    return next((i for i in items if i.get("id") == item_id), None)
+
+
+def get_items_by_ids(item_ids: list) -> list:
+    """Resolve ids to items in one pass over the gallery, keeping the given order.
+    Unknown ids are skipped."""
+    items = get_gallery_view()
+    if isinstance(items, shared_snapshot.SharedGallery):
+        return [i for i in map(items.get, item_ids) if i is not None]
+    wanted = set(item_ids)
+    found = {}
+    for item in items:
+        item_id = item.get("id")
+        if item_id in wanted:
+            found[item_id] = item
+    return [found[i] for i in item_ids if i in found]
+
+
+def get_categories() -> list:
+    """Sorted distinct item categories."""
+    items = get_gallery_view()
+    if isinstance(items, shared_snapshot.SharedGallery):
+        return sorted(items.facet_values("category"))
+    return sorted(set(i.get("category", "Other") for i in items))
+
+
 def save_gallery_items(items: list) -> None:
     """Save gallery metadata."""
     save_json(METADATA_FILE, items)
+    _notify("gallery_replaced")
 
 
 def get_ratings() -> dict:
@@ -50,11 +256,15 @@ def get_ratings() -> dict:
 
 def save_rating(item_id: str, rating: int, user_id: str = "default") -> None:
     """Save user rating for an item."""
-    ratings = get_ratings()
-    if item_id not in ratings:
-        ratings[item_id] = {}
-    ratings[item_id][user_id] = rating
-    save_json(RATINGS_FILE, ratings)
+    def apply(ratings):
+        item_ratings = ratings.setdefault(item_id, {})
+        previous = item_ratings.get(user_id)
+        item_ratings[user_id] = rating
+        return previous, dict(item_ratings)
+
+    previous, item_ratings = update_json(RATINGS_FILE, apply, {})
+    _notify("rating_saved", item_id=item_id, user_id=user_id, rating=rating, previous=previous,
+            ratings=item_ratings)
 
 
 def get_avg_rating(item_id: str) -> Optional[float]:
@@ -73,53 +283,133 @@ def get_playlists() -> dict:
 
 def save_playlist(name: str, item_ids: list) -> None:
     """Save or update a playlist."""
-    playlists = get_playlists()
-    playlists[name] = item_ids
-    save_json(PLAYLISTS_FILE, playlists)
+    def apply(playlists):
+        playlists[name] = list(dict.fromkeys(item_ids))
+        _forget_members(name)
+
+    update_json(PLAYLISTS_FILE, apply, {})
+
+
+def create_playlist(name: str, item_ids: list) -> bool:
+    """Save a new playlist. Returns False, leaving it untouched, if the name is taken."""
+    def apply(playlists):
+        if name in playlists:
+            return Unchanged(False)
+        playlists[name] = list(dict.fromkeys(item_ids))
+        _forget_members(name)
+        return True
+
+    return update_json(PLAYLISTS_FILE, apply, {})
 
 
 def add_to_playlist(playlist_name: str, item_id: str) -> None:
     """Add item to playlist."""
-    playlists = get_playlists()
-    if playlist_name not in playlists:
-        playlists[playlist_name] = []
-    if item_id not in playlists[playlist_name]:
-        playlists[playlist_name].append(item_id)
-    save_json(PLAYLISTS_FILE, playlists)
+    add_items_to_playlist(playlist_name, [item_id])
+
+
+def add_items_to_playlist(playlist_name: str, item_ids: list) -> int:
+    """Append items not already in the playlist, keeping order. Returns number added."""
+    def apply(playlists):
+        ids = playlists.setdefault(playlist_name, [])
+        members = _members(playlists, playlist_name)
+        added = 0
+        for item_id in item_ids:
+            if item_id not in members:
+                members.add(item_id)
+                ids.append(item_id)
+                added += 1
+        return added
+
+    return update_json(PLAYLISTS_FILE, apply, {})
+
+
+def remove_from_playlist(playlist_name: str, item_ids: list) -> int:
+    """Remove items from a playlist. Returns number removed."""
+    def apply(playlists):
+        if playlist_name not in playlists:
+            return Unchanged(0)
+        ids = playlists[playlist_name]
+        drop = set(item_ids)
+        kept = [i for i in ids if i not in drop]
+        if len(kept) == len(ids):
+            return Unchanged(0)
+        playlists[playlist_name] = kept
+        _forget_members(playlist_name)
+        return len(ids) - len(kept)
+
+    return update_json(PLAYLISTS_FILE, apply, {})
+
+
+def delete_playlist(playlist_name: str) -> bool:
+    """Delete a playlist. Returns True if it existed."""
+    def apply(playlists):
+        if playlists.pop(playlist_name, None) is None:
+            return Unchanged(False)
+        _forget_members(playlist_name)
+        return True
+
+    return update_json(PLAYLISTS_FILE, apply, {})
+
+
+def new_item_id(item: dict, position: int) -> str:
+    """Generate id for an item appended at 1-based gallery position."""
+    return f"item_{position}_{hash((item.get('title'), item.get('source'))) % 10000}"
 
 
 def add_gallery_item(item: dict) -> str:
     """Add new item to gallery, return generated id."""
-    items = get_gallery_items()
-    new_id = f"item_{len(items) + 1}_{hash(str(item)) % 10000}"
-    item["id"] = new_id
-    items.append(item)
-    save_gallery_items(items)
+    def apply(items):
+        item["id"] = new_item_id(item, len(items) + 1)
+        items.append(item)
+        return item["id"], get_gallery_version()
+
+    new_id, base = update_json(METADATA_FILE, apply, [])
+    _notify("item_added", item=item, base=base)
     return new_id
 
 
+def add_gallery_items(new_items: list) -> int:
+    """Append many items in one locked commit, assigning ids. Returns number added."""
+    def apply(items):
+        for item in new_items:
+            item["id"] = new_item_id(item, len(items) + 1)
+            items.append(item)
+        return len(new_items)
+
+    added = update_json(METADATA_FILE, apply, [])
+    _notify("gallery_replaced")
+    return added
+
+
 def clear_entire_gallery() -> None:
     """Delete all gallery items, ratings, and playlists. Start fresh."""
-    save_gallery_items([])
+    save_json(METADATA_FILE, [])
     save_json(RATINGS_FILE, {})
     save_json(PLAYLISTS_FILE, {})
+    _notify("gallery_replaced")
 
 
 def delete_gallery_item(item_id: str) -> bool:
     """Remove item from gallery. Also removes from ratings and playlists. Returns True if deleted."""
-    items = get_gallery_items()
-    filtered = [i for i in items if i.get("id") != item_id]
-    if len(filtered) == len(items):
+    def remove_item(items):
+        removed = next((i for i in items if i.get("id") == item_id), None)
+        if removed is None:
+            return Unchanged((None, None))
+        items[:] = [i for i in items if i.get("id") != item_id]
+        return removed, get_gallery_version()
+
+    removed, base = update_json(METADATA_FILE, remove_item, [])
+    if removed is None:
         return False
-    save_gallery_items(filtered)
     # Clean up ratings
-    ratings = get_ratings()
-    if item_id in ratings:
-        del ratings[item_id]
-        save_json(RATINGS_FILE, ratings)
+    removed_ratings = update_json(RATINGS_FILE, lambda ratings: ratings.pop(item_id, None), {})
     # Clean up playlists
-    playlists = get_playlists()
-    for name in playlists:
-        playlists[name] = [i for i in playlists[name] if i != item_id]
-    save_json(PLAYLISTS_FILE, playlists)
+    def remove_from_playlists(playlists):
+        for name, ids in playlists.items():
+            if item_id in ids:
+                playlists[name] = [i for i in ids if i != item_id]
+                _forget_members(name)
+
+    update_json(PLAYLISTS_FILE, remove_from_playlists, {})
+    _notify("item_deleted", item=removed, ratings=removed_ratings or {}, base=base)
     return True
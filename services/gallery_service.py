@@ -0,0 +1,56 @@
+"""Gallery queries - filtering and sorting over gallery items."""
+from services.ai_service import search_semantic
+from services.data_service import get_ratings
+from services import metrics
+from services.shared_snapshot import SharedGallery
+
+SORT_OPTIONS = ["Relevance", "Title A-Z", "Title Z-A", "Rating", "Newest"]
+
+
+def _avg_ratings() -> dict:
+    """{item_id: average rating}. Loads ratings once and averages each rated item
+    once; get_avg_rating re-reads the ratings file per call."""
+    return {
+        item_id: round(sum(vals.values()) / len(vals), 1)
+        for item_id, vals in get_ratings().items() if vals
+    }
+
+
+def _filter_and_sort_shared(gallery, category, content_type, sort_by, query):
+    """Search, facets and sorting on the snapshot's indexes and title ranks. Returns
+    a lazy Selection, so only the items actually read (one page) are decoded."""
+    idxs = gallery.select(query, category, content_type)
+    if sort_by in ("Title A-Z", "Title Z-A"):
+        idxs = sorted(idxs, key=gallery.title_rank.__getitem__, reverse=sort_by == "Title Z-A")
+    elif sort_by == "Rating":
+        # Only rated items are looked up; everything else sorts as 0
+        by_index = {}
+        for item_id, avg in _avg_ratings().items():
+            n = gallery.index_of(item_id)
+            if n is not None:
+                by_index[n] = avg
+        idxs = sorted(idxs, key=lambda n: by_index.get(n, 0), reverse=True)
+    return gallery.subset(idxs)
+
+
+@metrics.timed("gallery_service.filter_and_sort")
+def filter_and_sort(items, category, content_type, sort_by, query=""):
+    """Filter and sort gallery items."""
+    if isinstance(items, SharedGallery):
+        return _filter_and_sort_shared(items, category, content_type, sort_by, query)
+    if query:
+        items = search_semantic(query, items)
+    if category != "All":
+        items = [i for i in items if i.get("category", "Other") == category]
+    if content_type != "All":
+        items = [i for i in items if i.get("type") == content_type]
+    
+    if sort_by == "Title A-Z":
+        items = sorted(items, key=lambda x: x.get("title", "").lower())
+    elif sort_by == "Title Z-A":
+        items = sorted(items, key=lambda x: x.get("title", "").lower(), reverse=True)
+    elif sort_by == "Rating":
+        avgs = _avg_ratings()
+        items = sorted(items, key=lambda x: avgs.get(x.get("id"), 0), reverse=True)
+    
+    return items
@@ -0,0 +1,92 @@
+"""Media helpers - YouTube URL handling, thumbnails and action timestamps."""
+import math
+import re
+from typing import Optional
+
+_YOUTUBE_ID_RE = re.compile(
+    r"(?:youtube\.com/watch\?v=|youtube\.com/embed/|youtu\.be/)([a-zA-Z0-9_-]{11})"
+)
+
+_TIMESTAMP_RE = re.compile(r"\s*(\d+)(?::(\d+))?(?::(\d+))?\s*")
+
+DEFAULT_THUMBNAIL = "https://picsum.photos/400/225"
+DEFAULT_SOURCE = "https://picsum.photos/800/600"
+
+
+def extract_youtube_id(url: str) -> Optional[str]:
+    """Extract YouTube video ID from various URL formats."""
+    if not url or not isinstance(url, str):
+        return None
+    m = _YOUTUBE_ID_RE.search(url)
+    return m.group(1) if m else None
+
+
+def normalize_youtube_url(url: str) -> str:
+    """Convert YouTube URL to embed format for reliable playback."""
+    vid = extract_youtube_id(url)
+    return f"https://www.youtube.com/embed/{vid}" if vid else url
+
+
+def get_youtube_thumbnail(url: str) -> str:
+    """Get YouTube thumbnail image URL from video URL."""
+    vid = extract_youtube_id(url)
+    return f"https://img.youtube.com/vi/{vid}/hqdefault.jpg" if vid else url
+
+
+def item_thumbnail(item: dict, default: str = DEFAULT_THUMBNAIL) -> str:
+    """Thumbnail URL for an item, preferring the YouTube thumbnail of its source."""
+    source = item.get("source", "")
+    if extract_youtube_id(source):
+        return get_youtube_thumbnail(source)
+    return item.get("thumbnail", default)
+
+
+def format_timestamp(seconds: int) -> str:
+    """Format seconds as HH:MM:SS."""
+    seconds = max(int(seconds), 0)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def parse_timestamp(value: str) -> Optional[int]:
+    """Parse HH:MM:SS / MM:SS into seconds, None if not a timestamp."""
+    if not value or not isinstance(value, str):
+        return None
+    m = _TIMESTAMP_RE.fullmatch(value)
+    if not m:
+        return None
+    seconds = 0
+    for p in m.groups():
+        if p is not None:
+            seconds = seconds * 60 + int(p)
+    return seconds
+
+
+def normalize_action(action: dict) -> dict:
+    """Fill in start_time / timestamp_sec so each action carries both."""
+    if not isinstance(action, dict):
+        raise ValueError("action is not an object")
+    name = str(action.get("name", "")).strip()
+    if not name:
+        raise ValueError("action without a name")
+    ts = action.get("timestamp_sec")
+    start = action.get("start_time")
+    if start is not None and not isinstance(start, str):
+        raise ValueError(f"start_time of action '{name}' must be a string like '00:01:30'")
+    if ts is None:
+        ts = parse_timestamp(start)
+    elif isinstance(ts, bool):
+        raise ValueError(f"invalid timestamp_sec for action '{name}'")
+    elif type(ts) is not int:
+        try:
+            ts = float(ts)
+        except (TypeError, ValueError):
+            raise ValueError(f"invalid timestamp_sec for action '{name}'")
+        if not math.isfinite(ts):
+            # json.loads turns 1e999 into inf, which int() can't convert
+            raise ValueError(f"invalid timestamp_sec for action '{name}'")
+        ts = int(ts)
+    if ts is not None and ts < 0:
+        raise ValueError(f"negative timestamp_sec for action '{name}'")
+    if not start:
+        start = format_timestamp(ts) if ts is not None else "N/A"
+    return {"name": name, "start_time": start, "timestamp_sec": ts or 0}
@@ -0,0 +1,213 @@
+"""Lightweight in-process instrumentation - timing spans, latency percentiles, bytes.
+
+Usage:
+    with metrics.span("data_service.load_json") as sp:
+        raw = f.read()
+        sp.add_bytes(read=len(raw))
+
+    @metrics.timed("ai_service.search_semantic")
+    def search_semantic(...): ...
+
+Disabled unless METRICS_ENABLED is set (or enable() is called); when disabled a
+span is a shared no-op object and a timed function costs one flag check.
+"""
+import functools
+import json
+import threading
+import time
+from collections import deque
+from itertools import count
+
+from config import METRICS_ENABLED
+
+SAMPLES_PER_SPAN = 2048
+MAX_TRACES = 10_000
+
+_enabled = METRICS_ENABLED
+_lock = threading.Lock()
+_stats = {}
+_traces = deque(maxlen=MAX_TRACES)
+_seq = count(1)
+
+
+class _Stat:
+    """Aggregated measurements for one span name."""
+
+    __slots__ = ("count", "total", "samples", "bytes_read", "bytes_written")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=SAMPLES_PER_SPAN)
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+
+class _Span:
+    """Active timing span; records itself on exit."""
+
+    __slots__ = ("name", "start", "bytes_read", "bytes_written")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    def add_bytes(self, read: int = 0, written: int = 0) -> None:
+        self.bytes_read += read
+        self.bytes_written += written
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _record(self.name, self.start, time.perf_counter() - self.start, self.bytes_read, self.bytes_written)
+        return False
+
+
+class _NoopSpan:
+    """Stand-in span used while instrumentation is off."""
+
+    __slots__ = ()
+
+    def add_bytes(self, read: int = 0, written: int = 0) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def enable(on: bool = True) -> None:
+    """Turn instrumentation on or off at runtime."""
+    global _enabled
+    _enabled = on
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def span(name: str):
+    """Context manager timing the enclosed block under `name`."""
+    return _Span(name) if _enabled else _NOOP
+
+
+def timed(name: str = None):
+    """Decorator timing every call of the wrapped function."""
+    def decorator(fn):
+        span_name = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _record(name: str, start: float, duration: float, bytes_read: int, bytes_written: int) -> None:
+    with _lock:
+        stat = _stats.get(name)
+        if stat is None:
+            stat = _stats[name] = _Stat()
+        stat.count += 1
+        stat.total += duration
+        stat.samples.append(duration)
+        stat.bytes_read += bytes_read
+        stat.bytes_written += bytes_written
+        _traces.append({
+            "seq": next(_seq),
+            "name": name,
+            "ts": time.time() - duration,
+            "duration_ms": round(duration * 1000, 3),
+            "bytes_read": bytes_read,
+            "bytes_written": bytes_written,
+            "thread": threading.current_thread().name,
+            "thread_id": threading.get_ident(),
+        })
+
+
+def _percentile(sorted_samples: list, q: float) -> float:
+    if not sorted_samples:
+        return 0.0
+    idx = min(len(sorted_samples) - 1, int(round(q * (len(sorted_samples) - 1))))
+    return sorted_samples[idx]
+
+
+def snapshot() -> list:
+    """Per-span aggregates: count, total/p50/p95/p99 ms and bytes, slowest total first."""
+    with _lock:
+        items = [(name, s.count, s.total, sorted(s.samples), s.bytes_read, s.bytes_written)
+                 for name, s in _stats.items()]
+    rows = []
+    for name, n, total, samples, read, written in items:
+        rows.append({
+            "span": name,
+            "count": n,
+            "total_ms": round(total * 1000, 3),
+            "p50_ms": round(_percentile(samples, 0.50) * 1000, 3),
+            "p95_ms": round(_percentile(samples, 0.95) * 1000, 3),
+            "p99_ms": round(_percentile(samples, 0.99) * 1000, 3),
+            "bytes_read": read,
+            "bytes_written": written,
+        })
+    rows.sort(key=lambda r: -r["total_ms"])
+    return rows
+
+
+def mark() -> int:
+    """Sequence number of the latest trace; pass to traces_since() later."""
+    with _lock:
+        return _traces[-1]["seq"] if _traces else 0
+
+
+def traces_since(seq: int = 0) -> list:
+    """Traces recorded after the given mark (oldest first)."""
+    with _lock:
+        return [t for t in _traces if t["seq"] > seq]
+
+
+def traces_jsonl(seq: int = 0) -> str:
+    """Traces as JSON lines."""
+    return "".join(json.dumps(t) + "\n" for t in traces_since(seq))
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def to_prometheus(prefix: str = "media_dashboard") -> str:
+    """Aggregates in Prometheus text exposition format."""
+    rows = snapshot()
+    lines = [
+        f"# HELP {prefix}_span_seconds Latency of instrumented spans.",
+        f"# TYPE {prefix}_span_seconds summary",
+    ]
+    for r in rows:
+        label = f'span="{_label(r["span"])}"'
+        for q, key in (("0.5", "p50_ms"), ("0.95", "p95_ms"), ("0.99", "p99_ms")):
+            lines.append(f'{prefix}_span_seconds{{{label},quantile="{q}"}} {r[key] / 1000:.6f}')
+        lines.append(f"{prefix}_span_seconds_sum{{{label}}} {r['total_ms'] / 1000:.6f}")
+        lines.append(f"{prefix}_span_seconds_count{{{label}}} {r['count']}")
+    for metric, key in (("bytes_read", "bytes_read"), ("bytes_written", "bytes_written")):
+        lines.append(f"# HELP {prefix}_span_{metric}_total Bytes {metric.split('_')[1]} inside spans.")
+        lines.append(f"# TYPE {prefix}_span_{metric}_total counter")
+        for r in rows:
+            lines.append(f'{prefix}_span_{metric}_total{{span="{_label(r["span"])}"}} {r[key]}')
+    return "\n".join(lines) + "\n"
+
+
+def reset() -> None:
+    """Drop all aggregates and traces."""
+    with _lock:
+        _stats.clear()
+        _traces.clear()
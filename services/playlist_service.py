@@ -0,0 +1,106 @@
+"""Playlist engine - ordered, deduplicated playlists, paging and set operations."""
+import math
+import threading
+from typing import Optional
+
+from config import PLAYLISTS_FILE
+from services import metrics
+from services.data_service import create_playlist, get_items_by_ids, get_playlists
+
+PAGE_SIZE = 10
+
+_cache = {"version": None, "playlists": {}}
+_cache_lock = threading.Lock()
+
+
+class Playlist:
+    """Ordered id list for playback plus a set for O(1) membership."""
+
+    def __init__(self, name: str, item_ids=()):
+        self.name = name
+        self.ids = []
+        self._members = set()
+        self.extend(item_ids)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __contains__(self, item_id) -> bool:
+        return item_id in self._members
+
+    def add(self, item_id: str) -> bool:
+        if item_id in self._members:
+            return False
+        self._members.add(item_id)
+        self.ids.append(item_id)
+        return True
+
+    def extend(self, item_ids) -> int:
+        return sum(1 for item_id in item_ids if self.add(item_id))
+
+    def remove(self, item_ids) -> int:
+        drop = self._members.intersection(item_ids)
+        if drop:
+            self.ids = [i for i in self.ids if i not in drop]
+            self._members -= drop
+        return len(drop)
+
+    def page_count(self, per_page: int = PAGE_SIZE) -> int:
+        return max(1, math.ceil(len(self.ids) / per_page))
+
+    def page(self, page: int, per_page: int = PAGE_SIZE) -> list:
+        """Ids on a 0-based page."""
+        start = max(page, 0) * per_page
+        return self.ids[start:start + per_page]
+
+    def union(self, other: "Playlist", name: str = None) -> "Playlist":
+        """This playlist's order, then other's items not already present."""
+        result = Playlist(name or f"{self.name} ∪ {other.name}", self.ids)
+        result.extend(other.ids)
+        return result
+
+    def intersection(self, other: "Playlist", name: str = None) -> "Playlist":
+        return Playlist(name or f"{self.name} ∩ {other.name}", [i for i in self.ids if i in other])
+
+    def difference(self, other: "Playlist", name: str = None) -> "Playlist":
+        return Playlist(name or f"{self.name} − {other.name}", [i for i in self.ids if i not in other])
+
+
+SET_OPERATIONS = {
+    "Union": Playlist.union,
+    "Intersection": Playlist.intersection,
+    "Difference": Playlist.difference,
+}
+
+
+def get_all_playlists() -> dict:
+    """{name: Playlist}, rebuilt only when the playlists file changes."""
+    try:
+        version = PLAYLISTS_FILE.stat().st_mtime_ns
+    except FileNotFoundError:
+        version = 0
+    with _cache_lock:
+        if _cache["version"] != version:
+            _cache["playlists"] = {name: Playlist(name, ids) for name, ids in get_playlists().items()}
+            _cache["version"] = version
+        return _cache["playlists"]
+
+
+def get_playlist(name: str) -> Playlist:
+    return get_all_playlists().get(name) or Playlist(name)
+
+
+def resolve(item_ids: list) -> list:
+    """Items for the ids, in order, in a single pass over the gallery."""
+    with metrics.span("playlist_service.resolve"):
+        return get_items_by_ids(item_ids)
+
+
+def combine(first: str, second: str, operation: str, new_name: str) -> Optional[Playlist]:
+    """Save the union/intersection/difference of two playlists as a new playlist.
+    Returns None, saving nothing, if a playlist named new_name already exists."""
+    result = SET_OPERATIONS[operation](get_playlist(first), get_playlist(second), new_name)
+    return result if create_playlist(result.name, result.ids) else None
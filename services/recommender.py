@@ -0,0 +1,436 @@
+"""Related-items recommender - precomputed top-k neighbours per item.
+
+Each item is a sparse feature row built from its tags, its category and the
+users who rated it (rating / 5). Every block is L2-normalized and weighted,
+then the row is normalized, so row dot products are cosine similarities.
+
+A full build multiplies row blocks against the whole matrix and keeps the
+top STORED_K neighbours per item in RELATED_DB, an SQLite table keyed by item
+id; the detail page reads one row. After save_rating / add_gallery_item /
+delete_gallery_item the changed row is scored against all rows with one
+sparse mat-vec, and only the neighbour lists it enters or leaves are
+rewritten, in one transaction. Lists keep more candidates than are shown so
+a neighbour can drop out without a rebuild.
+
+All of this runs on a background worker, never inside the user's write: change
+events are queued and the worker loads the model on first use, then applies
+them in order. data_service loads this module before notifying, so every
+writing process keeps the store current. gallery_replaced (clear, bulk
+import) only marks the store stale, and changes to a missing or stale store
+are dropped: a read that finds it so queues a rebuild, which reads the files,
+and shows nothing until it lands.
+
+The in-memory matrix belongs to the process that applies an update; changes
+made by other processes reach it at the next full rebuild
+(`python -m services.recommender --rebuild`).
+"""
+import json
+import logging
+import math
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # recommendations are disabled without numpy/scipy
+    np = sparse = None
+
+from config import RELATED_DB
+from services import data_service, metrics
+from services.data_service import (
+    get_gallery_items,
+    get_gallery_version,
+    get_ratings,
+)
+
+TOP_K = 6
+STORED_K = 16
+WEIGHTS = {"tag": 1.0, "cat": 0.5, "user": 1.0}
+MAX_BLOCK_CELLS = 1 << 24  # dense similarity block size (float32 -> 64 MB)
+FOLD_AFTER = 256  # pending row overrides before the CSR matrix is rebuilt
+READY, STALE = "ready", "stale"  # store state; absent until the first build
+
+_lock = threading.Lock()  # guards _pending / _worker
+_model_lock = threading.Lock()  # held while the model is built or updated
+_model = None
+_pending = []  # (event, details) waiting for the worker
+_worker = None
+_running = None  # event the worker is applying
+_local = threading.local()  # per-thread connection to RELATED_DB
+logger = logging.getLogger(__name__)
+
+
+def item_features(item: dict, item_ratings: dict) -> dict:
+    """Weighted, normalized feature map {feature_name: value} for one item."""
+    blocks = {
+        "tag": {f"tag:{str(t).strip().lower()}": 1.0 for t in item.get("tags", []) if str(t).strip()},
+        "cat": {f"cat:{item.get('category', '')}": 1.0} if item.get("category") else {},
+        "user": {f"user:{u}": r / 5 for u, r in (item_ratings or {}).items() if r},
+    }
+    features = {}
+    for name, block in blocks.items():
+        norm = math.sqrt(sum(v * v for v in block.values()))
+        for f, v in block.items():
+            features[f] = WEIGHTS[name] * v / norm
+    total = math.sqrt(sum(v * v for v in features.values()))
+    return {f: v / total for f, v in features.items()} if total else {}
+
+
+class Model:
+    """Feature matrix plus neighbour lists, updatable one row at a time."""
+
+    def __init__(self, items: list, ratings: dict):
+        self.ids = [i.get("id", "") for i in items]
+        self.row_of = {item_id: n for n, item_id in enumerate(self.ids)}
+        # Just what item_features needs, so updates never reload the data files
+        self.items = {i.get("id", ""): {"tags": i.get("tags", []), "category": i.get("category")} for i in items}
+        self.ratings = {item_id: dict(r) for item_id, r in ratings.items() if item_id in self.row_of}
+        self.vocab = {}
+        self.deleted = set()
+        self.overrides = {}  # row -> (cols, vals) newer than self.matrix
+        rows, cols, vals = [], [], []
+        for n, item in enumerate(items):
+            c, v = self._encode(item_features(item, self.ratings.get(self.ids[n])))
+            rows.extend([n] * len(c))
+            cols.extend(c)
+            vals.extend(v)
+        self.matrix = sparse.csr_matrix(
+            (np.array(vals, dtype=np.float32), (np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64))),
+            shape=(len(self.ids), max(len(self.vocab), 1)),
+        )
+        self.neighbours = {}
+        self.reverse = {}
+        self.floor = np.zeros(len(self.ids), dtype=np.float32)  # lowest kept score per full list
+
+    def _encode(self, features: dict) -> tuple:
+        cols = [self.vocab.setdefault(f, len(self.vocab)) for f in features]
+        return cols, list(features.values())
+
+    def compute_all(self) -> None:
+        """Top STORED_K neighbours for every row, in dense blocks of rows."""
+        n = len(self.ids)
+        block = max(1, min(1024, MAX_BLOCK_CELLS // max(n, 1)))
+        transposed = self.matrix.T.tocsc()
+        self.neighbours = {}
+        for start in range(0, n, block):
+            stop = min(start + block, n)
+            sims = (self.matrix[start:stop] @ transposed).toarray()
+            sims[np.arange(stop - start), np.arange(start, stop)] = 0
+            k = min(STORED_K, n - 1)
+            if k <= 0:
+                break
+            top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+            for r in range(stop - start):
+                cand = top[r][np.argsort(-sims[r, top[r]], kind="stable")]
+                self.neighbours[self.ids[start + r]] = [
+                    [self.ids[c], round(float(sims[r, c]), 4)] for c in cand if sims[r, c] > 0
+                ]
+        self.set_neighbours(self.neighbours)
+
+    def set_neighbours(self, neighbours: dict) -> None:
+        """Adopt neighbour lists and derive the reverse index and score floors."""
+        self.neighbours = neighbours
+        self.reverse = {}
+        self.floor[:] = 0
+        for item_id, lst in neighbours.items():
+            for other, _ in lst:
+                self.reverse.setdefault(other, set()).add(item_id)
+            row = self.row_of.get(item_id)
+            if row is not None and len(lst) >= STORED_K:
+                self.floor[row] = lst[-1][1]
+
+    def _scores(self, cols: list, vals: list) -> "np.ndarray":
+        """Similarity of a feature row against every row (self excluded by caller)."""
+        vec = np.zeros(self.matrix.shape[1], dtype=np.float32)
+        for c, v in zip(cols, vals):
+            if c < len(vec):
+                vec[c] = v
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        scores[:self.matrix.shape[0]] = self.matrix @ vec
+        lookup = dict(zip(cols, vals))
+        for row, (rcols, rvals) in self.overrides.items():
+            scores[row] = sum(v * lookup.get(c, 0.0) for c, v in zip(rcols, rvals))
+        for item_id in self.deleted:
+            scores[self.row_of[item_id]] = 0
+        return scores
+
+    def add_item(self, item: dict) -> dict:
+        item_id = item.get("id", "")
+        self.items[item_id] = {"tags": item.get("tags", []), "category": item.get("category")}
+        return self.update_row(item_id)
+
+    def set_rating(self, item_id: str, user_id: str, rating: int) -> dict:
+        if item_id not in self.items:
+            return {}
+        self.ratings.setdefault(item_id, {})[user_id] = rating
+        return self.update_row(item_id)
+
+    def update_row(self, item_id: str) -> dict:
+        """Re-score one new or changed item; returns the changed neighbour lists."""
+        row = self.row_of.get(item_id)
+        if row is None:
+            row = self.row_of[item_id] = len(self.ids)
+            self.ids.append(item_id)
+            self.floor = np.append(self.floor, np.float32(0))
+        self.deleted.discard(item_id)
+        cols, vals = self._encode(item_features(self.items[item_id], self.ratings.get(item_id)))
+        self.overrides[row] = (cols, vals)
+        scores = self._scores(cols, vals)
+        scores[row] = 0
+
+        changed = {}
+        k = min(STORED_K, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k] if k else []
+        own = sorted(((float(scores[c]), self.ids[c]) for c in top if scores[c] > 0), reverse=True)
+        changed[item_id] = self._set_list(item_id, [[o, round(s, 4)] for s, o in own])
+
+        # Other rows: those that listed this item, or that it now outranks
+        for other in list(self.reverse.get(item_id, ())):
+            changed[other] = self._place(other, item_id, float(scores[self.row_of[other]]))
+        for c in np.nonzero(scores > self.floor)[0]:
+            other = self.ids[c]
+            if other not in changed:
+                changed[other] = self._place(other, item_id, float(scores[c]))
+        if len(self.overrides) >= FOLD_AFTER:
+            self._fold()
+        return changed
+
+    def remove_row(self, item_id: str) -> dict:
+        """Drop an item from every neighbour list; returns the changed lists."""
+        if item_id not in self.row_of:
+            if item_id not in self.reverse and item_id not in self.neighbours:
+                return {}
+            # Deleted before the model was loaded: only its persisted lists remain
+            changed = {item_id: None}
+            for other, _ in self.neighbours.pop(item_id, []):
+                self.reverse.get(other, set()).discard(item_id)
+            for other in self.reverse.pop(item_id, set()):
+                if other in self.neighbours:
+                    changed[other] = self._place(other, item_id, 0.0)
+            return changed
+        self.deleted.add(item_id)
+        self.items.pop(item_id, None)
+        self.ratings.pop(item_id, None)
+        changed = {item_id: None}
+        self._set_list(item_id, [])
+        del self.neighbours[item_id]
+        for other in self.reverse.pop(item_id, set()):
+            if other in self.neighbours:
+                changed[other] = self._place(other, item_id, 0.0)
+        return changed
+
+    def _set_list(self, item_id: str, new: list) -> list:
+        for other, _ in self.neighbours.get(item_id, []):
+            self.reverse.get(other, set()).discard(item_id)
+        self.neighbours[item_id] = new
+        for other, _ in new:
+            self.reverse.setdefault(other, set()).add(item_id)
+        self.floor[self.row_of[item_id]] = new[-1][1] if len(new) >= STORED_K else 0
+        return new
+
+    def _place(self, owner: str, item_id: str, score: float) -> list:
+        """Insert/move/remove item_id in owner's list according to its new score."""
+        lst = [e for e in self.neighbours.get(owner, []) if e[0] != item_id]
+        if score > 0:
+            lst.append([item_id, round(score, 4)])
+            lst.sort(key=lambda e: -e[1])
+            lst = lst[:STORED_K]
+        return self._set_list(owner, lst)
+
+    def _fold(self) -> None:
+        """Rebuild the CSR matrix with pending row overrides applied."""
+        lil = self.matrix.tolil()
+        lil.resize((len(self.ids), max(len(self.vocab), 1)))
+        for row, (cols, vals) in self.overrides.items():
+            lil.rows[row] = sorted(cols)
+            lookup = dict(zip(cols, vals))
+            lil.data[row] = [lookup[c] for c in lil.rows[row]]
+        self.matrix = lil.tocsr()
+        self.overrides = {}
+
+
+def available() -> bool:
+    return np is not None
+
+
+def _connect() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        RELATED_DB.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(RELATED_DB, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")  # readers don't wait for a rebuild
+        conn.execute("CREATE TABLE IF NOT EXISTS neighbours (item_id TEXT PRIMARY KEY, list TEXT NOT NULL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        _local.conn = conn
+    return conn
+
+
+@contextmanager
+def _transaction():
+    """Write transaction on RELATED_DB, exclusive across threads and processes."""
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def _state(conn: sqlite3.Connection) -> Optional[str]:
+    row = conn.execute("SELECT value FROM meta WHERE key = 'state'").fetchone()
+    return row[0] if row else None
+
+
+def _set_state(conn: sqlite3.Connection, state: str) -> None:
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('state', ?)", (state,))
+
+
+def rebuild() -> dict:
+    """Full recompute from the data files; replaces the stored lists."""
+    global _model
+    if not available():
+        raise RuntimeError("numpy and scipy are required for related items")
+    with _model_lock, metrics.span("recommender.rebuild"):
+        version = get_gallery_version()
+        model = Model(get_gallery_items(), get_ratings())
+        model.compute_all()
+        with _transaction() as conn:
+            # Replaced while computing: its stale mark stays
+            current = get_gallery_version() == version
+            if current:
+                conn.execute("DELETE FROM neighbours")
+                conn.executemany("INSERT INTO neighbours (item_id, list) VALUES (?, ?)",
+                                 ((item_id, json.dumps(lst)) for item_id, lst in model.neighbours.items()))
+                _set_state(conn, READY)
+        _model = model if current else None
+    return {"items": len(model.ids), "features": len(model.vocab)}
+
+
+def _get_model() -> Optional[Model]:
+    """In-memory model matching the persisted neighbours, loaded on first use.
+    None if the store is missing or stale, i.e. a rebuild is needed."""
+    global _model
+    if _model is None:
+        conn = _connect()
+        if _state(conn) != READY:
+            return None
+        stored = {item_id: json.loads(lst) for item_id, lst in conn.execute("SELECT item_id, list FROM neighbours")}
+        _model = Model(get_gallery_items(), get_ratings())
+        _model.set_neighbours(stored)
+    return _model
+
+
+def _persist(changed: dict) -> None:
+    with _transaction() as conn:
+        conn.executemany("DELETE FROM neighbours WHERE item_id = ?",
+                         [(item_id,) for item_id, lst in changed.items() if lst is None])
+        conn.executemany("INSERT OR REPLACE INTO neighbours (item_id, list) VALUES (?, ?)",
+                         [(item_id, json.dumps(lst)) for item_id, lst in changed.items() if lst is not None])
+
+
+def _apply(event: str, details: dict) -> None:
+    """Run one queued event on the worker thread."""
+    if event == "refresh":
+        # Another process may have rebuilt it since the read that asked
+        if _state(_connect()) != READY:
+            rebuild()
+        return
+    with _model_lock, metrics.span(f"recommender.{event}"):
+        model = _get_model()
+        if model is None:
+            changed = None
+        elif event == "rating_saved":
+            changed = model.set_rating(details["item_id"], details["user_id"], details["rating"])
+        elif event == "item_added":
+            changed = model.add_item(details["item"])
+        elif event == "item_deleted":
+            changed = model.remove_row(details["item"].get("id", ""))
+        else:
+            return
+        if changed:
+            _persist(changed)
+
+
+def _work() -> None:
+    global _worker, _running
+    while True:
+        with _lock:
+            if not _pending:
+                _worker = _running = None
+                return
+            event, details = _pending.pop(0)
+            _running = event
+        try:
+            _apply(event, details)
+        except Exception:
+            logger.exception("recommender: %s failed", event)
+
+
+def _enqueue(event: str, details: dict) -> None:
+    """Queue an event for the worker, starting it if idle. Caller holds _lock."""
+    global _worker
+    if event == "refresh" and (_running == "refresh" or any(e == "refresh" for e, _ in _pending)):
+        return
+    _pending.append((event, details))
+    if _worker is None:
+        # Not a daemon: a short-lived script waits for its updates to be saved
+        _worker = threading.Thread(target=_work, name="recommender", daemon=False)
+        _worker.start()
+
+
+def _on_change(event: str, **details) -> None:
+    global _model
+    if not available():
+        return
+    if event == "gallery_replaced":
+        with _transaction() as conn:
+            _set_state(conn, STALE)
+        _model = None  # describes the old gallery; reloaded after the rebuild
+        return
+    with _lock:
+        _enqueue(event, details)
+
+
+data_service.subscribe(_on_change)
+
+
+def request_rebuild() -> None:
+    """Rebuild the stored lists in the background if they are missing or stale
+    (no-op while a rebuild is queued or running)."""
+    if available():
+        with _lock:
+            _enqueue("refresh", {})
+
+
+def related_item_ids(item_id: str, k: int = TOP_K) -> list:
+    """Precomputed [(item_id, score)] most similar to item_id - a keyed lookup."""
+    state, lst = _connect().execute(
+        "SELECT (SELECT value FROM meta WHERE key = 'state'),"
+        " (SELECT list FROM neighbours WHERE item_id = ?)", (item_id,)).fetchone()
+    if state != READY:
+        request_rebuild()
+        return []
+    return [(other, score) for other, score in json.loads(lst)[:k]] if lst else []
+
+
+def related_items(item_id: str, k: int = TOP_K) -> list:
+    """Most similar gallery items to item_id, best first."""
+    return data_service.get_items_by_ids([other for other, _ in related_item_ids(item_id, k)])
+
+
+if __name__ == "__main__":
+    import sys
+
+    if "--rebuild" in sys.argv:
+        t0 = time.perf_counter()
+        stats = rebuild()
+        print(f"Related items for {stats['items']} items ({stats['features']} features) "
+              f"in {time.perf_counter() - t0:.1f}s -> {RELATED_DB}")
+    else:
+        print("Usage: python -m services.recommender --rebuild")
@@ -0,0 +1,339 @@
+"""Shared-memory gallery snapshot for several Streamlit processes on one host.
+
+The process that writes gallery metadata publishes it into a
+multiprocessing.shared_memory segment named ``<prefix>_<generation>`` and bumps
+the generation stored in the small ``<prefix>_ctl`` segment. Other processes
+map the current segment read-only and switch when the generation changes, so
+an extra worker costs a mapping of shared pages instead of a parsed copy.
+
+Segment layout: 8-byte magic, uint64 meta length, JSON meta (section offsets,
+facet ranges, source mtime), then 8-byte aligned sections:
+
+    item_offsets  uint64[n + 1]  boundaries of each item's JSON in `items`
+    items         bytes          UTF-8 JSON of every item, concatenated
+    text_offsets  uint64[n + 1]  boundaries of each item's search text
+    text          bytes          lowercased search text, items separated by NUL
+    id_offsets    uint64[n + 1]  boundaries of each item's id in `ids`
+    ids           bytes          UTF-8 item ids, concatenated
+    title_rank    uint32[n]      rank of each item's lowercased title (equal titles, equal rank)
+    id_hashes     uint64[n]      sorted 64-bit hashes of item ids
+    id_pos        uint32[n]      item index for each entry of id_hashes
+    facet_idx     uint32[...]    item indices grouped by category/type value
+
+Items are decoded only when accessed; search scans `text` in place with `re`,
+and select / sorting work on item indices, so a query decodes only the page
+of results that is actually shown (see Selection).
+"""
+import hashlib
+import json
+import re
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Sequence
+from multiprocessing import shared_memory
+from typing import Optional
+
+MAGIC = b"MIDSNAP2"
+_HEADER = struct.Struct("<8sQ")
+_GEN = struct.Struct("<Q")
+FACET_FIELDS = ("category", "type")
+# Value a facet takes when the item lacks the field; matches get_categories
+FACET_DEFAULTS = {"category": "Other", "type": ""}
+
+_current = {}
+
+
+def _attach(name: str, create: bool = False, size: int = 0) -> shared_memory.SharedMemory:
+    """Open a segment without handing its lifetime to this process's resource tracker."""
+    try:
+        return shared_memory.SharedMemory(name=name, create=create, size=size, track=False)
+    except TypeError:  # Python < 3.13 has no track flag
+        shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+        from multiprocessing import resource_tracker
+        try:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return shm
+
+
+def _unlink(name: str) -> None:
+    # Plain (tracked) attach: unlink() unregisters from the tracker again
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+
+def id_hash(item_id: str) -> int:
+    """Stable 64-bit id hash (Python's hash() differs per process)."""
+    return int.from_bytes(hashlib.blake2b(str(item_id).encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def search_text(item: dict, text_field: str = "description") -> str:
+    """Searchable text, built the same way search_semantic builds it."""
+    return (str(item.get(text_field, "")) + " " + str(item.get("title", "")) + " " + str(item.get("actions", []))).lower()
+
+
+def _offsets(chunks: list) -> array:
+    offsets = array("Q", [0])
+    pos = 0
+    for c in chunks:
+        pos += len(c)
+        offsets.append(pos)
+    return offsets
+
+
+def build_segment(items: list, source_mtime: int = 0) -> bytes:
+    """Serialize items and their indexes into the snapshot layout."""
+    item_chunks = [json.dumps(i, ensure_ascii=False).encode("utf-8") for i in items]
+    text_chunks = [search_text(i).replace("\x00", " ").encode("utf-8") + b"\x00" for i in items]
+    id_chunks = [str(i.get("id", "")).encode("utf-8") for i in items]
+    titles = [str(i.get("title", "")).lower() for i in items]
+    title_rank = array("I", bytes(4 * len(items)))
+    rank, previous = -1, None
+    for n in sorted(range(len(items)), key=titles.__getitem__):
+        if titles[n] != previous:
+            rank, previous = rank + 1, titles[n]
+        title_rank[n] = rank
+
+    hashed = sorted((id_hash(i.get("id", "")), n) for n, i in enumerate(items))
+    facet_idx = array("I")
+    facets = {}
+    for field in FACET_FIELDS:
+        groups = {}
+        for n, i in enumerate(items):
+            groups.setdefault(str(i.get(field, FACET_DEFAULTS[field])), []).append(n)
+        facets[field] = {}
+        for value, idxs in sorted(groups.items()):
+            facets[field][value] = [len(facet_idx), len(idxs)]
+            facet_idx.extend(idxs)
+
+    sections = [
+        ("item_offsets", _offsets(item_chunks).tobytes()),
+        ("items", b"".join(item_chunks)),
+        ("text_offsets", _offsets(text_chunks).tobytes()),
+        ("text", b"".join(text_chunks)),
+        ("id_offsets", _offsets(id_chunks).tobytes()),
+        ("ids", b"".join(id_chunks)),
+        ("title_rank", title_rank.tobytes()),
+        ("id_hashes", array("Q", [h for h, _ in hashed]).tobytes()),
+        ("id_pos", array("I", [n for _, n in hashed]).tobytes()),
+        ("facet_idx", facet_idx.tobytes()),
+    ]
+    # Section offsets depend on the meta length, so lay out relative to the body
+    layout, pos = {}, 0
+    for name, data in sections:
+        layout[name] = [pos, len(data)]
+        pos += len(data) + (-len(data) % 8)
+    meta = json.dumps({"n": len(items), "sections": layout, "facets": facets, "source_mtime": source_mtime}).encode("utf-8")
+    meta += b" " * (-(len(meta) + _HEADER.size) % 8)
+    body = bytearray(pos)
+    for name, data in sections:
+        start = layout[name][0]
+        body[start:start + len(data)] = data
+    return _HEADER.pack(MAGIC, len(meta)) + meta + bytes(body)
+
+
+class SharedGallery(Sequence):
+    """Read-only, lazily decoded view of one published snapshot generation."""
+
+    def __init__(self, shm: shared_memory.SharedMemory, generation: int):
+        self._shm = shm
+        self.generation = generation
+        buf = shm.buf
+        magic, meta_len = _HEADER.unpack_from(buf, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{shm.name} is not a gallery snapshot")
+        meta = json.loads(bytes(buf[_HEADER.size:_HEADER.size + meta_len]))
+        base = _HEADER.size + meta_len
+        self._n = meta["n"]
+        self.facets = meta["facets"]
+        self.source_mtime = meta.get("source_mtime", 0)
+        self._views = []
+
+        def section(name, fmt=None):
+            start, length = meta["sections"][name]
+            view = buf[base + start:base + start + length]
+            self._views.append(view)
+            if fmt:
+                view = view.cast(fmt)
+                self._views.append(view)
+            return view
+
+        self._item_offsets = section("item_offsets", "Q")
+        self._items = section("items")
+        self._text_offsets = section("text_offsets", "Q")
+        self._text = section("text")
+        self._id_offsets = section("id_offsets", "Q")
+        self._ids = section("ids")
+        self.title_rank = section("title_rank", "I")
+        self._id_hashes = section("id_hashes", "Q")
+        self._id_pos = section("id_pos", "I")
+        self._facet_idx = section("facet_idx", "I")
+
+    def __len__(self) -> int:
+        return self._n
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._n))]
+        if index < 0:
+            index += self._n
+        if not 0 <= index < self._n:
+            raise IndexError("snapshot index out of range")
+        return json.loads(bytes(self._items[self._item_offsets[index]:self._item_offsets[index + 1]]))
+
+    def item_id(self, index: int) -> str:
+        """Id of the item at index, without decoding the item."""
+        return bytes(self._ids[self._id_offsets[index]:self._id_offsets[index + 1]]).decode("utf-8")
+
+    def index_of(self, item_id: str) -> Optional[int]:
+        """Position of an item id, via binary search over the id hashes."""
+        h = id_hash(item_id)
+        lo = bisect_left(self._id_hashes, h)
+        hi = bisect_right(self._id_hashes, h, lo)
+        for k in range(lo, hi):
+            n = self._id_pos[k]
+            if self.item_id(n) == str(item_id):
+                return n
+        return None
+
+    def get(self, item_id: str) -> Optional[dict]:
+        n = self.index_of(item_id)
+        return None if n is None else self[n]
+
+    def facet_values(self, field: str) -> list:
+        return list(self.facets.get(field, {}))
+
+    def facet_indices(self, field: str, value: str) -> list:
+        start, count = self.facets.get(field, {}).get(value, (0, 0))
+        return self._facet_idx[start:start + count].tolist()
+
+    def search(self, query: str) -> list:
+        """Item indices ranked like search_semantic (words matched, then gallery order)."""
+        words = query.lower().split()
+        scores = {}
+        offsets = self._text_offsets
+        for w in words:
+            seen = set()
+            for m in re.finditer(re.escape(w.encode("utf-8")), self._text):
+                n = bisect_right(offsets, m.start()) - 1
+                if n not in seen:
+                    seen.add(n)
+                    scores[n] = scores.get(n, 0) + 1
+        return sorted(scores, key=lambda n: (-scores[n], n))
+
+    def select(self, query: str = "", category: str = "All", content_type: str = "All"):
+        """Indices of the items matching query and facet filters; nothing is decoded."""
+        idxs = self.search(query) if query.strip() else range(self._n)
+        for field, value in (("category", category), ("type", content_type)):
+            if value != "All":
+                allowed = set(self.facet_indices(field, value))
+                idxs = [n for n in idxs if n in allowed]
+        return idxs
+
+    def subset(self, indices) -> "Selection":
+        return Selection(self, indices)
+
+    def __del__(self):
+        for view in reversed(getattr(self, "_views", [])):
+            view.release()
+        shm = getattr(self, "_shm", None)
+        if shm is not None:
+            shm.close()
+
+
+class Selection(Sequence):
+    """Items of a SharedGallery at the given indices, decoded only when accessed."""
+
+    def __init__(self, gallery: SharedGallery, indices):
+        self.gallery = gallery
+        self.indices = indices
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.gallery[n] for n in self.indices[index]]
+        return self.gallery[self.indices[index]]
+
+
+def _read_generation(prefix: str) -> int:
+    try:
+        ctl = _attach(f"{prefix}_ctl")
+    except FileNotFoundError:
+        return 0
+    try:
+        return _GEN.unpack_from(ctl.buf, 0)[0]
+    finally:
+        ctl.close()
+
+
+def publish(prefix: str, items: list, source_mtime: int = 0) -> int:
+    """Publish a new generation and retire the previous one. Caller serializes publishers."""
+    payload = build_segment(items, source_mtime)
+    try:
+        ctl = _attach(f"{prefix}_ctl", create=True, size=_GEN.size)
+        _GEN.pack_into(ctl.buf, 0, 0)
+    except FileExistsError:
+        ctl = _attach(f"{prefix}_ctl")
+    try:
+        old = _GEN.unpack_from(ctl.buf, 0)[0]
+        generation = old + 1
+        shm = _attach(f"{prefix}_{generation}", create=True, size=len(payload))
+        shm.buf[:len(payload)] = payload
+        shm.close()
+        _GEN.pack_into(ctl.buf, 0, generation)
+    finally:
+        ctl.close()
+    if old:
+        # Processes still mapping the old generation keep it until they switch
+        _unlink(f"{prefix}_{old}")
+    return generation
+
+
+def current(prefix: str) -> Optional[SharedGallery]:
+    """Latest published snapshot, or None if nothing has been published yet."""
+    cached = _current.get(prefix)
+    for _ in range(5):
+        generation = _read_generation(prefix)
+        if not generation:
+            return None
+        if cached is not None and cached.generation == generation:
+            return cached
+        try:
+            cached = SharedGallery(_attach(f"{prefix}_{generation}"), generation)
+        except FileNotFoundError:
+            continue  # retired between reading ctl and attaching; re-read ctl
+        _current[prefix] = cached
+        return cached
+    return None
+
+
+def unlink_all(prefix: str) -> None:
+    """Remove the current generation and control segments (e.g. after shutdown)."""
+    generation = _read_generation(prefix)
+    if generation:
+        _unlink(f"{prefix}_{generation}")
+    _unlink(f"{prefix}_ctl")
+    _current.pop(prefix, None)
+
+
+if __name__ == "__main__":
+    import sys
+    from pathlib import Path
+
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    from config import SHARED_SNAPSHOT
+
+    if "--unlink" in sys.argv and SHARED_SNAPSHOT:
+        unlink_all(SHARED_SNAPSHOT)
+        print(f"Removed shared snapshot segments for '{SHARED_SNAPSHOT}'")
+    else:
+        snap = current(SHARED_SNAPSHOT) if SHARED_SNAPSHOT else None
+        print(f"generation {snap.generation}, {len(snap)} items" if snap else "No shared snapshot published")
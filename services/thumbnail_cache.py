@@ -0,0 +1,212 @@
+"""Local thumbnail cache with a concurrent asyncio prefetcher.
+
+Remote thumbnails are downloaded into THUMBNAILS_DIR, resized, and served to
+cards as local files, so a rerun no longer refetches every image and a slow
+CDN cannot stall the gallery: cards fall back to the remote URL until the
+background prefetch has stored a copy.
+
+Downloads run concurrently (at most PER_HOST_LIMIT per host, TOTAL_LIMIT
+overall). Entries older than MAX_AGE_SEC are revalidated with If-None-Match /
+If-Modified-Since; a 304 only refreshes the timestamp.
+
+A payload that isn't an image Pillow can decode (an HTML error page, say) is
+never stored. Failed URLs are recorded in the index and not retried for
+RETRY_BASE_SEC, doubling with each consecutive failure up to MAX_AGE_SEC.
+"""
+import asyncio
+import hashlib
+import io
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlsplit
+
+from config import THUMBNAILS_DIR
+from services import metrics
+from services.data_service import load_json, update_json
+
+INDEX_FILE = THUMBNAILS_DIR / "index.json"
+THUMB_SIZE = (400, 225)
+PER_HOST_LIMIT = 4
+TOTAL_LIMIT = 16
+TIMEOUT_SEC = 10
+MAX_AGE_SEC = 24 * 3600
+RETRY_BASE_SEC = 60
+USER_AGENT = "media-dashboard-thumbnail-cache/1.0"
+
+_inflight = set()
+_inflight_lock = threading.Lock()
+_index_cache = {"version": None, "data": {}}
+
+
+def is_remote(url: str) -> bool:
+    return isinstance(url, str) and url.startswith(("http://", "https://"))
+
+
+def cache_path(url: str) -> Path:
+    return THUMBNAILS_DIR / (hashlib.sha1(url.encode("utf-8")).hexdigest() + ".jpg")
+
+
+def cached_path(url: str) -> Optional[Path]:
+    """Local copy of a thumbnail URL, or None if not cached yet."""
+    if not is_remote(url):
+        return None
+    path = cache_path(url)
+    return path if path.exists() else None
+
+
+def local_or_remote(url: str) -> str:
+    """What a card should render: the cached file if present, else the URL."""
+    path = cached_path(url)
+    return str(path) if path else url
+
+
+def _resize(data: bytes) -> bytes:
+    """Shrink to THUMB_SIZE as JPEG. Raises ValueError if data isn't a decodable image."""
+    try:
+        from PIL import Image
+    except ImportError:  # without Pillow, store the original bytes
+        return data
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img = img.convert("RGB")
+            img.thumbnail(THUMB_SIZE)
+            out = io.BytesIO()
+            img.save(out, "JPEG", quality=85)
+            return out.getvalue()
+    except Exception as e:
+        raise ValueError(f"not a decodable image ({len(data)} bytes)") from e
+
+
+def _index() -> dict:
+    """INDEX_FILE contents, re-read only when the file changed."""
+    try:
+        version = INDEX_FILE.stat().st_mtime_ns
+    except FileNotFoundError:
+        version = 0
+    if _index_cache["version"] != version:
+        _index_cache["data"] = load_json(INDEX_FILE, {})
+        _index_cache["version"] = version
+    return _index_cache["data"]
+
+
+def _retry_after(entry: dict) -> float:
+    """Seconds to wait after the last failure before fetching again."""
+    failures = entry.get("failures", 0)
+    return min(RETRY_BASE_SEC * 2 ** (failures - 1), MAX_AGE_SEC) if failures else 0
+
+
+def _due(urls, index: dict, max_age: float = MAX_AGE_SEC) -> list:
+    """Remote URLs that need a fetch: not cached, expired, and not backing off."""
+    now = time.time()
+    todo = []
+    for url in dict.fromkeys(u for u in urls if is_remote(u)):
+        entry = index.get(url, {})
+        if now - entry.get("failed_at", 0) < _retry_after(entry):
+            continue
+        if cache_path(url).exists() and now - entry.get("fetched_at", 0) < max_age:
+            continue
+        todo.append(url)
+    return todo
+
+
+def _fetch(url: str, entry: dict) -> dict:
+    """Blocking conditional GET; returns the updated index entry."""
+    headers = {"User-Agent": USER_AGENT}
+    path = cache_path(url)
+    if path.exists():
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+    request = urllib.request.Request(url, headers=headers)
+    try:
+        with urllib.request.urlopen(request, timeout=TIMEOUT_SEC) as resp:
+            data = resp.read()
+            etag = resp.headers.get("ETag")
+            last_modified = resp.headers.get("Last-Modified")
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            fresh = {k: v for k, v in entry.items() if k not in ("failed_at", "failures", "error")}
+            return {**fresh, "fetched_at": time.time(), "status": 304}
+        raise
+    payload = _resize(data)  # raises for a non-image, so nothing is stored
+    tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.part")
+    tmp.write_bytes(payload)
+    tmp.replace(path)
+    return {
+        "file": path.name,
+        "etag": etag,
+        "last_modified": last_modified,
+        "fetched_at": time.time(),
+        "bytes": len(payload),
+        "status": 200,
+    }
+
+
+async def prefetch(urls: list, per_host: int = PER_HOST_LIMIT, total: int = TOTAL_LIMIT,
+                   max_age: float = MAX_AGE_SEC) -> dict:
+    """Download or revalidate thumbnails concurrently. Returns {url: status}."""
+    index = load_json(INDEX_FILE, {})
+    todo = _due(urls, index, max_age)
+    if not todo:
+        return {}
+
+    overall = asyncio.Semaphore(total)
+    hosts = {}
+    results, entries = {}, {}
+
+    async def run(url):
+        host = urlsplit(url).netloc
+        limiter = hosts.setdefault(host, asyncio.Semaphore(per_host))
+        async with overall, limiter:
+            entry = index.get(url, {})
+            try:
+                entry = await asyncio.to_thread(_fetch, url, entry)
+            except Exception as e:
+                # Keep any cached copy and its validators; back off before retrying
+                entries[url] = {**entry, "failed_at": time.time(), "failures": entry.get("failures", 0) + 1,
+                                "error": str(e)[:200]}
+                results[url] = f"error: {e}"
+                return
+            entries[url] = entry
+            results[url] = entry["status"]
+
+    with metrics.span("thumbnail_cache.prefetch"):
+        await asyncio.gather(*(run(u) for u in todo))
+    if entries:
+        update_json(INDEX_FILE, lambda idx: idx.update(entries), {})
+    return results
+
+
+def prefetch_in_background(urls: list) -> None:
+    """Start a prefetch on a daemon thread for the URLs that are due and not in flight."""
+    due = _due(urls, _index())
+    with _inflight_lock:
+        pending = [u for u in due if u not in _inflight]
+        if not pending:
+            return
+        _inflight.update(pending)
+
+    def worker():
+        try:
+            asyncio.run(prefetch(pending))
+        finally:
+            with _inflight_lock:
+                _inflight.difference_update(pending)
+
+    threading.Thread(target=worker, name="thumbnail-prefetch", daemon=True).start()
+
+
+if __name__ == "__main__":
+    from services.data_service import get_gallery_items
+    from services.media_utils import item_thumbnail
+
+    urls = [item_thumbnail(i) for i in get_gallery_items()]
+    t0 = time.perf_counter()
+    statuses = asyncio.run(prefetch(urls))
+    print(f"Prefetched {len(statuses)} thumbnails in {time.perf_counter() - t0:.1f}s")
@@ -0,0 +1,243 @@
+"""Positional index over transcripts and action names for moment search.
+
+Every transcript and action name is a segment of its item. The index maps
+each token to {segment key: [token positions]}, so a phrase such as
+"add the pasta" is matched by checking that each following token occurs at
+the next position, without rescanning any text. Each hit is mapped to a
+seek offset: an action hit uses that action's timestamp; a transcript hit
+estimates its time from where it falls in the transcript and snaps to the
+nearest action timestamp.
+
+Items added or deleted through data_service update the index in place; any
+other change to the gallery (bulk import, another process) rebuilds it on a
+background thread while searches keep using the previous index.
+"""
+import re
+import threading
+from typing import Optional
+
+from services import data_service, metrics
+from services.data_service import get_gallery_item, get_gallery_version, get_gallery_view
+from services.media_utils import format_timestamp, parse_timestamp
+
+# Matched case-insensitively on the original text, never on text.lower(): lower()
+# can change the length of a string ("İ" -> "i̇"), which would shift the spans
+# _moment slices the text with away from the positions that were indexed
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:'[a-z0-9]+)*", re.IGNORECASE)
+TRANSCRIPT = 0  # segment number of the transcript; action i is segment i + 1
+MAX_SEGMENTS = 256
+SNIPPET_CHARS = 60
+
+_cache = {"version": None, "index": None, "building": False}
+_cache_lock = threading.Lock()  # guards _cache and searches against in-place updates
+_build_lock = threading.Lock()
+
+
+def tokenize(text: str) -> list:
+    return [token.lower() for token in _TOKEN_RE.findall(text)]
+
+
+def _segments(item: dict) -> list:
+    actions = item.get("actions", [])[:MAX_SEGMENTS - 1]
+    return [str(item.get("transcript", "") or "")] + [str(a.get("name", "")) for a in actions]
+
+
+class TranscriptIndex:
+    """Token -> {doc * MAX_SEGMENTS + segment: [positions]} over a gallery."""
+
+    def __init__(self, items):
+        self.items = items
+        self.added = {}  # doc -> item appended after the build
+        self.postings = {}
+        self.segment_lengths = {}
+        self.doc_ids = {}
+        for doc, item in enumerate(items):
+            self._index(doc, item)
+        self.next_doc = len(items)
+
+    def _index(self, doc: int, item: dict) -> None:
+        self.doc_ids[item.get("id", "")] = doc
+        for seg, text in enumerate(_segments(item)):
+            key = doc * MAX_SEGMENTS + seg
+            tokens = tokenize(text)
+            if not tokens:
+                continue
+            self.segment_lengths[key] = len(tokens)
+            for pos, tok in enumerate(tokens):
+                self.postings.setdefault(tok, {}).setdefault(key, []).append(pos)
+
+    def _item(self, doc: int) -> dict:
+        item = self.added.get(doc)
+        return item if item is not None else self.items[doc]
+
+    def add(self, item: dict) -> None:
+        """Index an item appended to the gallery."""
+        self.remove(item)
+        self.added[self.next_doc] = item
+        self._index(self.next_doc, item)
+        self.next_doc += 1
+
+    def remove(self, item: dict) -> None:
+        """Drop an item's segments; `item` must have the content that was indexed."""
+        doc = self.doc_ids.pop(item.get("id", ""), None)
+        if doc is None:
+            return
+        self.added.pop(doc, None)
+        for seg, text in enumerate(_segments(item)):
+            key = doc * MAX_SEGMENTS + seg
+            self.segment_lengths.pop(key, None)
+            for tok in set(tokenize(text)):
+                segments = self.postings.get(tok)
+                if segments is not None:
+                    segments.pop(key, None)
+                    if not segments:
+                        del self.postings[tok]
+
+    def phrase_hits(self, tokens: list, limit: int = None, doc: int = None) -> list:
+        """(segment key, start position) of occurrences of the token sequence,
+        in gallery order, optionally restricted to one document."""
+        if not tokens:
+            return []
+        lists = [self.postings.get(t) for t in tokens]
+        if not all(lists):
+            return []
+        if doc is not None:
+            keys = range(doc * MAX_SEGMENTS, (doc + 1) * MAX_SEGMENTS)
+        else:
+            # Only segments containing the rarest term can match
+            keys = sorted(min(lists, key=len))
+        hits = []
+        for key in keys:
+            if not all(key in p for p in lists):
+                continue
+            following = [set(p[key]) for p in lists[1:]]
+            for start in lists[0][key]:
+                if all(start + j + 1 in positions for j, positions in enumerate(following)):
+                    hits.append((key, start))
+                    if limit is not None and len(hits) >= limit:
+                        return hits
+        return hits
+
+    def search(self, query: str, limit: int = 20, item_id: str = None) -> list:
+        """Moments matching the phrase, with snippet and seek offset."""
+        tokens = tokenize(query)
+        doc = None
+        if item_id is not None:
+            doc = self.doc_ids.get(item_id)
+            if doc is None:
+                return []
+        results = []
+        for key, start in self.phrase_hits(tokens, limit, doc):
+            doc, seg = divmod(key, MAX_SEGMENTS)
+            results.append(self._moment(self._item(doc), seg, start, len(tokens)))
+        return results
+
+    def _moment(self, item: dict, seg: int, start: int, length: int) -> dict:
+        text = _segments(item)[seg]
+        spans = [m.span() for m in _TOKEN_RE.finditer(text)]
+        begin, end = spans[start][0], spans[start + length - 1][1]
+        if seg == TRANSCRIPT:
+            seconds = _estimate_seconds(item, begin / max(len(text), 1))
+            field = "transcript"
+        else:
+            seconds = item["actions"][seg - 1].get("timestamp_sec") or 0
+            field = "action"
+        lo = max(0, begin - SNIPPET_CHARS)
+        hi = min(len(text), end + SNIPPET_CHARS)
+        prefix = "…" if lo > 0 else ""
+        return {
+            "item_id": item.get("id", ""),
+            "title": item.get("title", ""),
+            "field": field,
+            "snippet": prefix + text[lo:hi] + ("…" if hi < len(text) else ""),
+            "match": text[begin:end],
+            "match_offset": len(prefix) + begin - lo,  # where the match starts in snippet
+            "start_sec": int(seconds),
+            "start_time": format_timestamp(seconds),
+        }
+
+
+def _estimate_seconds(item: dict, fraction: float) -> int:
+    """Map a relative transcript position to the nearest action timestamp."""
+    stamps = [a.get("timestamp_sec") or 0 for a in item.get("actions", [])]
+    duration = parse_timestamp(item.get("duration")) or (max(stamps) if stamps else 0)
+    estimate = fraction * duration
+    if not stamps:
+        return int(estimate)
+    return min(stamps, key=lambda ts: abs(ts - estimate))
+
+
+def _refresh(load_items) -> None:
+    """Rebuild (from load_items()) until the index matches the gallery version."""
+    with _build_lock:
+        try:
+            while True:
+                version = get_gallery_version()
+                with _cache_lock:
+                    if _cache["index"] is not None and _cache["version"] == version:
+                        return
+                with metrics.span("transcript_index.build"):
+                    index = TranscriptIndex(load_items())
+                with _cache_lock:
+                    _cache["index"], _cache["version"] = index, version
+        finally:
+            with _cache_lock:
+                _cache["building"] = False
+
+
+def get_index(version, load_items) -> TranscriptIndex:
+    """Index for the current gallery. Built synchronously the first time; after
+    that a change of `version` starts a background rebuild and the previous
+    index is served until it completes."""
+    with _cache_lock:
+        if _cache["index"] is not None:
+            if _cache["version"] != version and not _cache["building"]:
+                _cache["building"] = True
+                threading.Thread(target=_refresh, args=(load_items,), name="transcript-index",
+                                 daemon=True).start()
+            return _cache["index"]
+    _refresh(load_items)
+    with _cache_lock:
+        return _cache["index"]
+
+
+def _on_change(event: str, **details) -> None:
+    """Apply single-item changes to the built index instead of rebuilding it."""
+    if event not in ("item_added", "item_deleted"):
+        return
+    with _cache_lock:
+        index = _cache["index"]
+        # While building, the build picks up the change; an index that was
+        # already behind the file (e.g. another process wrote) is rebuilt by
+        # the next search instead
+        if index is None or _cache["building"] or _cache["version"] != details["base"]:
+            return
+        if event == "item_added":
+            index.add(details["item"])
+        else:
+            index.remove(details["item"])
+        _cache["version"] = get_gallery_version()
+
+
+def search_item_moments(item: dict, query: str, limit: int = 20) -> list:
+    """Search one item's transcript and action names for a phrase."""
+    # Indexing a single item on the spot is cheaper than consulting (or
+    # waiting for) the gallery index
+    with metrics.span("transcript_index.search"):
+        return TranscriptIndex([item]).search(query, limit)
+
+
+def search_moments(query: str, limit: int = 20, item_id: Optional[str] = None) -> list:
+    """Search transcripts and action names of the current gallery (or of one
+    item) for a phrase."""
+    if not tokenize(query):
+        return []
+    if item_id is not None:
+        item = get_gallery_item(item_id)
+        return search_item_moments(item, query, limit) if item is not None else []
+    index = get_index(get_gallery_version(), get_gallery_view)
+    with metrics.span("transcript_index.search"), _cache_lock:
+        return index.search(query, limit)
+
+
+data_service.subscribe(_on_change)